@@ -0,0 +1,122 @@
+#coding=utf-8
+# 以本機PTT替身伺服器測試爬蟲吞吐量：pages/sec、articles/sec、解析時間與峰值記憶體
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ptt_crawler import PTTCrawler
+from database_manager import DatabaseManager
+from ptt_standin_server import PTTStandinServer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為KB，macOS 為bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+class ParseTimer:
+    # 包裝爬蟲的解析函式，累計解析耗時（多執行緒安全）
+    def __init__(self, crawler):
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+        for name in ('parse_index_page', 'parse_article_content'):
+            setattr(crawler, name, self.wrap(getattr(crawler, name)))
+    
+    def wrap(self, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds += time.perf_counter() - start
+                    self.calls += 1
+        return timed
+
+def run_benchmark(args, base_url):
+    crawler = PTTCrawler(
+        board=args.board,
+        max_workers=args.threads,
+        requests_per_second=args.rps,
+        parser=args.parser,
+        backoff_base=0.05,
+        backoff_max=0.5,
+        base_url=base_url
+    )
+    timer = ParseTimer(crawler)
+    articles = crawler.iter_daily_articles(pages=args.pages)
+    
+    start = time.perf_counter()
+    if args.db:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with DatabaseManager(os.path.join(tmp_dir, 'bench.db')) as db_manager:
+                article_count = db_manager.insert_articles_stream(articles)
+    else:
+        article_count = sum(1 for _ in articles)
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'elapsed': elapsed,
+        'articles': article_count,
+        'parse_seconds': timer.seconds,
+        'parse_calls': timer.calls,
+        'http': crawler.get_http_stats()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="PTT爬蟲離線效能測試")
+    parser.add_argument("--pages", type=int, default=10, help="爬取頁數")
+    parser.add_argument("--board", type=str, default="Gossiping", help="看板名稱")
+    parser.add_argument("--threads", type=int, default=8, help="爬蟲同時進行的請求數")
+    parser.add_argument("--rps", type=float, default=0, help="每秒請求上限，0 表示不限速")
+    parser.add_argument("--parser", choices=["lxml", "html.parser"], default="lxml", help="HTML解析器")
+    parser.add_argument("--latency", type=float, default=0.05, help="替身伺服器每個請求的延遲秒數")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="替身伺服器隨機回應503的比例")
+    parser.add_argument("--db", action="store_true", help="同時寫入暫存SQLite資料庫")
+    parser.add_argument("--min-articles-per-sec", type=float, help="低於此吞吐量時以非零狀態結束，供回歸測試使用")
+    args = parser.parse_args()
+    
+    logging.disable(logging.WARNING)
+    
+    with PTTStandinServer(latency=args.latency, error_rate=args.error_rate) as server:
+        result = run_benchmark(args, server.base_url)
+        requests_served = server.request_count
+    
+    pages_per_sec = args.pages / result['elapsed']
+    articles_per_sec = result['articles'] / result['elapsed']
+    rss = peak_rss_mb()
+    
+    print("=" * 50)
+    print("PTT爬蟲離線效能測試")
+    print("=" * 50)
+    print(f"設定: pages={args.pages}, threads={args.threads}, rps={args.rps or '不限'}, parser={args.parser}, "
+          f"latency={args.latency}s, error_rate={args.error_rate}")
+    print(f"總耗時: {result['elapsed']:.2f} 秒")
+    print(f"文章數: {result['articles']}")
+    print(f"伺服器收到請求數: {requests_served}")
+    print(f"pages/sec: {pages_per_sec:.2f}")
+    print(f"articles/sec: {articles_per_sec:.2f}")
+    print(f"解析總時間: {result['parse_seconds']:.3f} 秒 (平均每頁 {result['parse_seconds'] / max(1, result['parse_calls']) * 1000:.2f} ms)")
+    print(f"峰值記憶體: {rss:.1f} MB" if rss is not None else "峰值記憶體: 此平台不支援")
+    print(f"HTTP統計: {result['http']}")
+    print("=" * 50)
+    
+    if args.min_articles_per_sec is not None and articles_per_sec < args.min_articles_per_sec:
+        print(f"吞吐量低於門檻 {args.min_articles_per_sec} articles/sec")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#coding=utf-8
+# 比較資料庫寫入吞吐量：逐筆寫入（預設rollback journal、每篇向量一次交易）與批次 executemany（WAL）
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database_manager
+from database_manager import DatabaseManager
+
+def make_articles(count, offset=0):
+    return [{
+        'title': f'[問卦] 測試標題{i}',
+        'author': f'user{i % 500}',
+        'date': 'Mon Jan  1 00:00:00 2024',
+        'content': f'測試內文{i}，' * 40,
+        'url': f'https://www.ptt.cc/bbs/Gossiping/M.{1700000000 + offset + i}.A.html'
+    } for i in range(count)]
+
+def make_vector_results(ids, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        'id': article_id,
+        'title_vector': rng.standard_normal(dim).astype(np.float32),
+        'content_vector': rng.standard_normal(dim).astype(np.float32)
+    } for article_id in ids]
+
+def bench_row_by_row(db_path, articles, dim):
+    # 改版前的寫入方式：預設 journal/synchronous，文章逐筆 execute，詞向量每篇一次 commit
+    pragmas = database_manager.CONNECTION_PRAGMAS
+    database_manager.CONNECTION_PRAGMAS = {}
+    try:
+        with DatabaseManager(db_path) as db_manager:
+            sql = '''
+                INSERT OR IGNORE INTO articles (title, author, date, content, url, board)
+                VALUES (?, ?, ?, ?, ?, ?)
+            '''
+            start = time.perf_counter()
+            cursor = db_manager.conn.cursor()
+            for article in articles:
+                cursor.execute(sql, (article['title'], article['author'], article['date'],
+                                     article['content'], article['url'], 'Gossiping'))
+            db_manager.conn.commit()
+            insert_time = time.perf_counter() - start
+            
+            ids = [row[0] for row in db_manager.conn.execute('SELECT id FROM articles')]
+            results = make_vector_results(ids, dim)
+            start = time.perf_counter()
+            for result in results:
+                db_manager.update_vectors(result['id'], result['title_vector'], result['content_vector'],
+                                          normalized=False, model_name='bench')
+            vector_time = time.perf_counter() - start
+    finally:
+        database_manager.CONNECTION_PRAGMAS = pragmas
+    return insert_time, vector_time
+
+def bench_batched(db_path, articles, dim, batch_size):
+    with DatabaseManager(db_path, write_batch_size=batch_size) as db_manager:
+        start = time.perf_counter()
+        db_manager.insert_articles(articles)
+        insert_time = time.perf_counter() - start
+        
+        ids = [row[0] for row in db_manager.conn.execute('SELECT id FROM articles')]
+        results = make_vector_results(ids, dim)
+        start = time.perf_counter()
+        db_manager.update_vectors_batch(results, normalized=False, model_name='bench')
+        vector_time = time.perf_counter() - start
+    return insert_time, vector_time
+
+def main():
+    parser = argparse.ArgumentParser(description="資料庫寫入吞吐量測試")
+    parser.add_argument("--articles", type=int, default=20000, help="文章數")
+    parser.add_argument("--dim", type=int, default=384, help="詞向量維度")
+    parser.add_argument("--batch-size", type=int, default=1000, help="批次寫入每個交易的列數")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    articles = make_articles(args.articles)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        before = bench_row_by_row(os.path.join(tmp_dir, "before.db"), articles, args.dim)
+        after = bench_batched(os.path.join(tmp_dir, "after.db"), articles, args.dim, args.batch_size)
+    
+    print(f"{args.articles} 篇文章，{args.dim} 維詞向量，批次大小 {args.batch_size}")
+    print(f"{'寫入項目':<10}{'逐筆(列/秒)':>14}{'批次+WAL(列/秒)':>18}{'加速':>8}")
+    print("-" * 52)
+    for name, old, new in (('文章', before[0], after[0]), ('詞向量', before[1], after[1])):
+        print(f"{name:<10}{args.articles / old:>14.0f}{args.articles / new:>18.0f}{old / new:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
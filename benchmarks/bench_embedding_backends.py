@@ -0,0 +1,101 @@
+#coding=utf-8
+# 比較PyTorch與ONNX int8兩種詞向量後端的啟動時間、編碼吞吐量與檢索recall@10
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+import subprocess
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backend import EMBEDDING_BACKENDS, create_embedding_backend
+from ptt_fixtures import make_sentence, make_title
+
+DEFAULT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+def make_corpus(size, seed=0):
+    # 固定種子的合成語料，標題與內文句子各半
+    rng = random.Random(seed)
+    return [make_title(rng) if i % 2 == 0 else make_sentence(rng, 6, 30) for i in range(size)]
+
+def measure_startup(backend, model_name, onnx_dir):
+    # 在新的行程中量測「啟動Python -> 載入後端 -> 編碼第一句」的時間，避免已載入的模組影響結果
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--startup-only", backend, "--model", model_name, "--onnx-dir", onnx_dir],
+        check=True
+    )
+    return time.perf_counter() - start
+
+def encode_normalized(model, texts, batch_size):
+    # 依長度排序分批編碼（與 VectorProcessor 相同），再還原順序並正規化
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    sorted_embeddings = model.encode([texts[i] for i in order], batch_size=batch_size, convert_to_numpy=True)
+    embeddings = np.empty_like(sorted_embeddings, dtype=np.float32)
+    embeddings[order] = sorted_embeddings
+    embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    return embeddings
+
+def top_k_neighbors(embeddings, query_ids, k):
+    scores = embeddings[query_ids] @ embeddings.T
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf  # 排除查詢本身
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description="詞向量後端效能測試")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL, help="詞向量模型名稱或本機路徑")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="語料句數")
+    parser.add_argument("--queries", type=int, default=200, help="計算recall的查詢數")
+    parser.add_argument("--batch-size", type=int, default=64, help="編碼批次大小")
+    parser.add_argument("--onnx-dir", type=str, default="onnx_models", help="ONNX模型匯出目錄")
+    parser.add_argument("--startup-only", choices=EMBEDDING_BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.startup_only:
+        model = create_embedding_backend(args.startup_only, args.model, model_dir=args.onnx_dir)
+        model.encode(["啟動測試"])
+        return
+    
+    logging.disable(logging.INFO)
+    
+    # 先在目前行程匯出ONNX模型，啟動時間只計入載入已匯出模型的成本
+    create_embedding_backend("onnx", args.model, model_dir=args.onnx_dir)
+    
+    corpus = make_corpus(args.corpus_size)
+    query_ids = np.random.default_rng(0).choice(len(corpus), size=min(args.queries, len(corpus)), replace=False)
+    
+    results = {}
+    for backend in EMBEDDING_BACKENDS:
+        startup = measure_startup(backend, args.model, args.onnx_dir)
+        model = create_embedding_backend(backend, args.model, model_dir=args.onnx_dir)
+        encode_normalized(model, corpus[:args.batch_size], args.batch_size)  # 暖機
+        
+        start = time.perf_counter()
+        embeddings = encode_normalized(model, corpus, args.batch_size)
+        elapsed = time.perf_counter() - start
+        
+        results[backend] = {
+            'startup': startup,
+            'sentences_per_sec': len(corpus) / elapsed,
+            'neighbors': top_k_neighbors(embeddings, query_ids, 10)
+        }
+        del model
+    
+    # 以PyTorch後端的前10名為基準計算ONNX後端的recall@10
+    reference = results['torch']['neighbors']
+    
+    print(f"模型: {args.model}，語料 {len(corpus)} 句，查詢 {len(query_ids)} 筆")
+    print(f"{'後端':<8}{'啟動(秒)':>12}{'句/秒':>12}{'recall@10':>12}")
+    print("-" * 44)
+    for backend, result in results.items():
+        recall = np.mean([
+            len(set(found) & set(expected)) / len(expected)
+            for found, expected in zip(result['neighbors'], reference)
+        ])
+        print(f"{backend:<8}{result['startup']:>12.2f}{result['sentences_per_sec']:>12.1f}{recall:>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#coding=utf-8
+# 比較關鍵字搜尋的 LIKE 全表掃描與 FTS5 trigram 全文索引（BM25排序）的查詢延遲
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from ptt_fixtures import make_sentence, make_title
+
+def populate(db_manager, articles, sentences_per_article, seed=0):
+    rng = random.Random(seed)
+    batch = []
+    for i in range(articles):
+        content = ''.join(make_sentence(rng) for _ in range(sentences_per_article))
+        if i % 1000 == 0:
+            # 每1000篇放入一個少見的專有名詞，模擬針對特定事件的搜尋
+            content += f"事件代號{i // 1000:04d}。"
+        batch.append({
+            'title': make_title(rng),
+            'content': content,
+            'url': f'https://www.ptt.cc/bbs/Gossiping/M.{1700000000 + i}.A.html'
+        })
+        if len(batch) >= 5000:
+            db_manager.insert_articles(batch)
+            batch = []
+    if batch:
+        db_manager.insert_articles(batch)
+
+def time_queries(func, keywords, limit):
+    latencies = []
+    for keyword in keywords:
+        start = time.perf_counter()
+        func(keyword, limit)
+        latencies.append(time.perf_counter() - start)
+    return np.median(latencies) * 1000, np.percentile(latencies, 95) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="關鍵字搜尋效能測試")
+    parser.add_argument("--articles", type=int, default=200000, help="文章數")
+    parser.add_argument("--sentences", type=int, default=8, help="每篇文章的句子數")
+    parser.add_argument("--limit", type=int, default=10, help="每次搜尋的結果數")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    # 常見詞組會命中大量文章，少見的專有名詞只命中少數文章
+    common_keywords = ['颱風油價', '演唱會棒球', '房價薪水', '捷運便當', '疫情選舉', '高雄股票']
+    rare_keywords = [f"事件代號{i:04d}" for i in range(0, max(1, args.articles // 1000), max(1, args.articles // 10000))]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with DatabaseManager(os.path.join(tmp_dir, "bench_search.db")) as db_manager:
+            start = time.perf_counter()
+            populate(db_manager, args.articles, args.sentences)
+            print(f"建立 {args.articles} 篇文章（含全文索引）耗時 {time.perf_counter() - start:.1f} 秒，"
+                  f"FTS5: {'啟用' if db_manager.fts_enabled else '未啟用'}")
+            
+            results = []
+            for name, keywords in (('常見詞組', common_keywords), ('少見名詞', rare_keywords)):
+                like_p50, like_p95 = time_queries(db_manager.search_articles_by_like, keywords, args.limit)
+                fts_p50, fts_p95 = time_queries(db_manager.search_articles_by_keyword, keywords, args.limit)
+                results.append((name, like_p50, like_p95, fts_p50, fts_p95))
+    
+    print(f"{'關鍵字':<8}{'LIKE p50':>12}{'LIKE p95':>12}{'FTS5 p50':>12}{'FTS5 p95':>12}{'加速':>8}  (ms)")
+    print("-" * 70)
+    for name, like_p50, like_p95, fts_p50, fts_p95 in results:
+        print(f"{name:<8}{like_p50:>12.2f}{like_p95:>12.2f}{fts_p50:>12.2f}{fts_p95:>12.2f}{like_p50 / fts_p50:>7.0f}x")
+
+if __name__ == "__main__":
+    main()
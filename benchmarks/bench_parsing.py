@@ -0,0 +1,68 @@
+#coding=utf-8
+# 比較lxml與BeautifulSoup(html.parser)兩種解析路徑的單頁解析時間
+import os
+import sys
+import time
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ptt_crawler import PTTCrawler
+from ptt_fixtures import make_index_page, make_article_page
+
+def time_per_call(func, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            func(page)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+def main():
+    parser = argparse.ArgumentParser(description="PTT頁面解析效能測試")
+    parser.add_argument("--pages", type=int, default=50, help="合成頁面數量")
+    parser.add_argument("--repeat", type=int, default=5, help="重複次數")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    index_pages = [make_index_page(page_no=39000 - i) for i in range(args.pages)]
+    article_pages = [make_article_page(article_id=f"M.{1700000000 + i}.A.000") for i in range(args.pages)]
+    
+    crawlers = {
+        'html.parser': PTTCrawler(parser='html.parser'),
+        'lxml': PTTCrawler(parser='lxml'),
+    }
+    if not crawlers['lxml'].use_lxml:
+        print("未安裝lxml，無法比較")
+        return
+    
+    # 兩種解析路徑的結果必須一致
+    for index_page, article_page in zip(index_pages, article_pages):
+        assert crawlers['lxml'].parse_index_page(index_page) == crawlers['html.parser'].parse_index_page(index_page)
+        assert crawlers['lxml'].parse_article_content(article_page) == crawlers['html.parser'].parse_article_content(article_page)
+    
+    # 原本的流程：索引頁解析兩次（文章列表 + 上一頁連結）
+    def legacy_index(html_content, crawler=crawlers['html.parser']):
+        crawler.parse_article_list(html_content)
+        crawler.parse_index_page(html_content)
+    
+    results = [
+        ('索引頁 (原流程，解析兩次)', time_per_call(legacy_index, index_pages, args.repeat)),
+        ('索引頁 html.parser', time_per_call(crawlers['html.parser'].parse_index_page, index_pages, args.repeat)),
+        ('索引頁 lxml', time_per_call(crawlers['lxml'].parse_index_page, index_pages, args.repeat)),
+        ('文章頁 html.parser', time_per_call(crawlers['html.parser'].parse_article_content, article_pages, args.repeat)),
+        ('文章頁 lxml', time_per_call(crawlers['lxml'].parse_article_content, article_pages, args.repeat)),
+    ]
+    
+    print(f"{'項目':<24}{'每頁耗時(ms)':>14}")
+    print("-" * 40)
+    for name, seconds in results:
+        print(f"{name:<24}{seconds * 1000:>14.3f}")
+    
+    print("-" * 40)
+    print(f"索引頁加速: {results[0][1] / results[2][1]:.1f}x")
+    print(f"文章頁加速: {results[3][1] / results[4][1]:.1f}x")
+
+if __name__ == "__main__":
+    main()
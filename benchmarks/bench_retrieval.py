@@ -0,0 +1,127 @@
+#coding=utf-8
+# 比較檢索排序後取回前 top_k 篇完整文章的方式：逐篇以標題搜尋（N+1查詢）vs 以id一次批次查詢
+# 另列出載入詞向量陣列、numpy矩陣排序與常駐FAISS索引查詢的耗時
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from vector_processor import VectorProcessor
+from vector_index import VectorIndex
+from ptt_fixtures import make_sentence, make_title
+
+def populate(db_manager, articles, sentences_per_article, dim, seed=0):
+    rng = random.Random(seed)
+    vector_rng = np.random.default_rng(seed)
+    for start in range(0, articles, 5000):
+        batch = []
+        for i in range(start, min(articles, start + 5000)):
+            # 約三成為回文，與原文標題相同只差 "Re: " 前綴
+            title = make_title(rng)
+            if batch and rng.random() < 0.3:
+                title = "Re: " + rng.choice(batch)['title'].replace("Re: ", "")
+            batch.append({
+                'title': title,
+                'content': ''.join(make_sentence(rng) for _ in range(sentences_per_article)),
+                'url': f'https://www.ptt.cc/bbs/Gossiping/M.{1700000000 + i}.A.html'
+            })
+        db_manager.insert_articles(batch)
+    
+    ids = [row[0] for row in db_manager.conn.execute('SELECT id FROM articles ORDER BY id')]
+    for start in range(0, len(ids), 10000):
+        batch_ids = ids[start:start + 10000]
+        title_matrix = VectorProcessor.normalize_rows(vector_rng.standard_normal((len(batch_ids), dim)).astype(np.float32))
+        content_matrix = VectorProcessor.normalize_rows(vector_rng.standard_normal((len(batch_ids), dim)).astype(np.float32))
+        db_manager.update_vectors_batch([
+            {'id': article_id, 'title_vector': title_vector, 'content_vector': content_vector}
+            for article_id, title_vector, content_vector in zip(batch_ids, title_matrix, content_matrix)
+        ], normalized=True, model_name='bench')
+
+def fetch_by_title(search, ranked):
+    # 改版前的做法：每個結果以標題搜尋一次，取第一筆
+    results = []
+    for article_id, title in ranked:
+        found = search(title, 1)
+        if found:
+            results.append(found[0])
+    return results
+
+def percentiles(latencies):
+    return np.median(latencies) * 1000, np.percentile(latencies, 95) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="檢索步驟延遲測試")
+    parser.add_argument("--articles", type=int, default=100000, help="文章數")
+    parser.add_argument("--sentences", type=int, default=8, help="每篇文章的句子數")
+    parser.add_argument("--dim", type=int, default=384, help="詞向量維度")
+    parser.add_argument("--top-k", type=int, default=10, help="每次檢索的結果數")
+    parser.add_argument("--queries", type=int, default=20, help="查詢數")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with DatabaseManager(os.path.join(tmp_dir, "bench_retrieval.db")) as db_manager:
+            start = time.perf_counter()
+            populate(db_manager, args.articles, args.sentences, args.dim)
+            print(f"建立 {args.articles} 篇文章與 {args.dim} 維詞向量耗時 {time.perf_counter() - start:.1f} 秒")
+            
+            start = time.perf_counter()
+            article_ids, title_matrix, content_matrix, _ = db_manager.get_article_vector_arrays()
+            load_time = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            article_index = VectorIndex(args.dim)
+            article_index.add(article_ids, VectorProcessor.fuse_vectors(title_matrix, content_matrix))
+            index_time = time.perf_counter() - start
+            
+            query_rng = np.random.default_rng(1)
+            timings = {'rank': [], 'faiss': [], 'keyword': [], 'like': [], 'bulk': []}
+            wrong = {'keyword': 0, 'like': 0}
+            total_hits = 0
+            
+            for _ in range(args.queries):
+                query = query_rng.standard_normal(args.dim).astype(np.float32)
+                start = time.perf_counter()
+                indices, _, _, _ = VectorProcessor.search_vector_matrix(query, title_matrix, content_matrix, args.top_k)
+                ranked_ids = [int(article_ids[index]) for index in indices]
+                timings['rank'].append(time.perf_counter() - start)
+                
+                start = time.perf_counter()
+                article_index.search(query, args.top_k)
+                timings['faiss'].append(time.perf_counter() - start)
+                
+                start = time.perf_counter()
+                bulk = db_manager.get_articles_by_ids(ranked_ids)
+                timings['bulk'].append(time.perf_counter() - start)
+                total_hits += len(ranked_ids)
+                
+                ranked = [(article['id'], article['title']) for article in bulk]
+                for name, search in (('keyword', db_manager.search_articles_by_keyword),
+                                     ('like', db_manager.search_articles_by_like)):
+                    start = time.perf_counter()
+                    found = fetch_by_title(search, ranked)
+                    timings[name].append(time.perf_counter() - start)
+                    found_ids = [article['id'] for article in found]
+                    wrong[name] += len(ranked_ids) - sum(a == b for a, b in zip(found_ids, ranked_ids))
+    
+    print(f"載入詞向量陣列: {load_time * 1000:.0f} ms，建立常駐FAISS索引: {index_time * 1000:.0f} ms（啟動時一次）")
+    print(f"{'步驟':<24}{'p50(ms)':>10}{'p95(ms)':>10}{'取錯文章':>10}")
+    print("-" * 54)
+    for name, label in (('rank', f'矩陣排序 top-{args.top_k}'), ('faiss', f'FAISS索引 top-{args.top_k}')):
+        p50, p95 = percentiles(timings[name])
+        print(f"{label:<24}{p50:>10.2f}{p95:>10.2f}{'':>10}")
+    for name, label in (('like', '逐篇標題 LIKE'), ('keyword', '逐篇標題 全文索引'), ('bulk', 'get_articles_by_ids')):
+        p50, p95 = percentiles(timings[name])
+        errors = f"{wrong[name] / total_hits:.0%}" if name in wrong else "0%"
+        print(f"{label:<24}{p50:>10.2f}{p95:>10.2f}{errors:>10}")
+
+if __name__ == "__main__":
+    main()
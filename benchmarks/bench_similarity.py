@@ -0,0 +1,90 @@
+#coding=utf-8
+# 比較逐篇Python迴圈與矩陣化top-k相似度搜尋在不同文章數下的查詢延遲
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_processor import VectorProcessor
+
+def legacy_search(query_vector, article_vectors, top_k):
+    # 原本的做法：每篇文章各算兩次餘弦相似度，再整個排序
+    similarities = []
+    for article in article_vectors:
+        scores = []
+        for key in ('title_vector', 'content_vector'):
+            v1 = np.array(query_vector)
+            v2 = np.array(article[key])
+            scores.append(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)))
+        similarities.append((0.3 * scores[0] + 0.7 * scores[1], article['id']))
+    similarities.sort(reverse=True)
+    return [article_id for _, article_id in similarities[:top_k]]
+
+def random_matrix(rng, rows, dim, chunk=100000):
+    matrix = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, chunk):
+        end = min(rows, start + chunk)
+        matrix[start:end] = rng.standard_normal((end - start, dim), dtype=np.float32)
+    return VectorProcessor.normalize_rows(matrix)
+
+def time_queries(func, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        latencies.append(time.perf_counter() - start)
+    return np.median(latencies) * 1000, np.percentile(latencies, 99) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="相似度搜尋效能測試")
+    parser.add_argument("--sizes", type=str, default="10000,100000,1000000", help="以逗號分隔的文章數")
+    parser.add_argument("--dim", type=int, default=384, help="向量維度")
+    parser.add_argument("--top-k", type=int, default=10, help="取前k名")
+    parser.add_argument("--queries", type=int, default=20, help="查詢次數")
+    parser.add_argument("--legacy-max", type=int, default=100000, help="文章數超過此值時略過逐篇迴圈的測試")
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    
+    print(f"{'文章數':>10}{'矩陣 p50(ms)':>14}{'矩陣 p99(ms)':>14}{'迴圈 p50(ms)':>14}{'加速':>8}")
+    print("-" * 62)
+    
+    for size in [int(value) for value in args.sizes.split(",")]:
+        title_matrix = random_matrix(rng, size, args.dim)
+        content_matrix = random_matrix(rng, size, args.dim)
+        
+        matrix_p50, matrix_p99 = time_queries(
+            lambda query: VectorProcessor.search_vector_matrix(query, title_matrix, content_matrix, args.top_k),
+            queries
+        )
+        
+        legacy_text = f"{'略過':>12}"
+        speedup_text = f"{'-':>8}"
+        if size <= args.legacy_max:
+            article_vectors = [
+                {'id': i, 'title_vector': title_matrix[i].tolist(), 'content_vector': content_matrix[i].tolist()}
+                for i in range(size)
+            ]
+            
+            # 兩種做法的前k名必須一致
+            expected = legacy_search(queries[0].tolist(), article_vectors, args.top_k)
+            indices, _, _, _ = VectorProcessor.search_vector_matrix(queries[0], title_matrix, content_matrix, args.top_k)
+            assert expected == indices.tolist()
+            
+            legacy_p50, _ = time_queries(
+                lambda query: legacy_search(query.tolist(), article_vectors, args.top_k),
+                queries[:3]
+            )
+            legacy_text = f"{legacy_p50:>14.2f}"
+            speedup_text = f"{legacy_p50 / matrix_p50:>7.0f}x"
+            del article_vectors
+        
+        print(f"{size:>10}{matrix_p50:>14.2f}{matrix_p99:>14.2f}{legacy_text}{speedup_text}")
+        del title_matrix, content_matrix
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#coding=utf-8
+# 比較詞向量以JSON文字（舊版，存於文章資料表）與float32 BLOB（article_vectors 資料表）儲存時的資料庫大小與載入時間（含一次性遷移）
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager, decode_vector
+
+def build_legacy_database(db_path, articles, dim, seed=0):
+    # 建立舊版格式的資料庫：詞向量為JSON文字，user_version 為 0
+    rng = np.random.default_rng(seed)
+    with DatabaseManager(db_path) as db_manager:
+        db_manager.insert_articles([
+            {'title': f'標題{i}', 'content': f'內容{i}', 'url': f'https://www.ptt.cc/bbs/Gossiping/M.{i}.A.html'}
+            for i in range(articles)
+        ])
+    
+    # 舊版詞向量存在文章資料表的欄位中
+    conn = sqlite3.connect(db_path)
+    for column in ('title_vector TEXT', 'content_vector TEXT', 'vectors_normalized INTEGER DEFAULT 0'):
+        conn.execute(f'ALTER TABLE articles ADD COLUMN {column}')
+    conn.execute('DROP TABLE article_vectors')
+    for start in range(0, articles, 1000):
+        ids = range(start + 1, min(articles, start + 1000) + 1)
+        conn.executemany(
+            'UPDATE articles SET title_vector = ?, content_vector = ?, vectors_normalized = 1 WHERE id = ?',
+            [(json.dumps(rng.standard_normal(dim).tolist()), json.dumps(rng.standard_normal(dim).tolist()), i) for i in ids]
+        )
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+def time_vector_load(db_path, table, key):
+    # 回傳 (載入時間, 標題詞向量矩陣, 內容詞向量矩陣)，依 key 排序以便比對遷移前後的內容
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    rows = conn.execute(f'SELECT title_vector, content_vector FROM {table} ORDER BY {key}').fetchall()
+    title_matrix = np.vstack([decode_vector(title) for title, _ in rows])
+    content_matrix = np.vstack([decode_vector(content) for _, content in rows])
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, title_matrix, content_matrix
+
+def main():
+    parser = argparse.ArgumentParser(description="詞向量儲存格式效能測試")
+    parser.add_argument("--articles", type=int, default=20000, help="文章數")
+    parser.add_argument("--dim", type=int, default=384, help="詞向量維度")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench_vectors.db")
+        build_legacy_database(db_path, args.articles, args.dim)
+        
+        json_size = os.path.getsize(db_path)
+        json_load, json_titles, json_contents = time_vector_load(db_path, 'articles', 'id')
+        
+        start = time.perf_counter()
+        DatabaseManager(db_path).close()  # 開啟時自動執行一次性遷移
+        migrate_time = time.perf_counter() - start
+        
+        blob_size = os.path.getsize(db_path)
+        blob_load, blob_titles, blob_contents = time_vector_load(db_path, 'article_vectors', 'article_id')
+    
+    # 遷移後的詞向量需與原本的JSON內容一致（float32精度）
+    identical = (np.allclose(json_titles, blob_titles, atol=1e-6)
+                 and np.allclose(json_contents, blob_contents, atol=1e-6))
+    print(f"{args.articles} 篇文章，每篇2個 {args.dim} 維詞向量 {json_titles.shape}，遷移前後內容一致: {identical}")
+    print(f"{'格式':<8}{'資料庫大小(MB)':>16}{'載入時間(秒)':>14}")
+    print("-" * 38)
+    print(f"{'JSON':<8}{json_size / 2**20:>16.1f}{json_load:>14.3f}")
+    print(f"{'BLOB':<8}{blob_size / 2**20:>16.1f}{blob_load:>14.3f}")
+    print(f"遷移耗時 {migrate_time:.1f} 秒；大小縮小 {json_size / blob_size:.1f} 倍，載入加速 {json_load / blob_load:.1f} 倍")
+
+if __name__ == "__main__":
+    main()
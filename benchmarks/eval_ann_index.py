@@ -0,0 +1,146 @@
+#coding=utf-8
+# 評估近似最近鄰索引（HNSW / IVF-PQ）相對於精確搜尋的 recall@k、單筆查詢延遲 p50/p99 與索引記憶體
+# 以資料庫中已儲存的文章融合向量（或合成資料）建立索引，供依資料選擇索引類型與參數
+# 另測量刪除部分向量後（模擬清理舊文章、重新計算詞向量）的 recall 與延遲
+import os
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import VectorIndex
+from vector_processor import VectorProcessor
+from eval_pca_recall import make_synthetic_vectors
+
+def load_corpus(args):
+    # 回傳 (文章id, 索引向量, 查詢向量)；資料庫模式以標題向量當作查詢，近似使用者問題與文章的比對
+    if args.db:
+        from database_manager import DatabaseManager
+        with DatabaseManager(args.db) as db_manager:
+            ids, title_matrix, content_matrix, normalized = db_manager.get_article_vector_arrays()
+        if not normalized.all():
+            title_matrix = VectorProcessor.normalize_rows(title_matrix)
+            content_matrix = VectorProcessor.normalize_rows(content_matrix)
+        vectors = VectorProcessor.fuse_vectors(title_matrix, content_matrix)
+        rows = np.random.default_rng(1).choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+        return ids, vectors, title_matrix[rows]
+    
+    vectors = make_synthetic_vectors(args.size, args.dim)
+    rng = np.random.default_rng(1)
+    rows = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = VectorProcessor.normalize_rows(vectors[rows] + 0.5 * rng.standard_normal((len(rows), args.dim)).astype(np.float32) / np.sqrt(args.dim))
+    return np.arange(1, len(vectors) + 1, dtype=np.int64), vectors, queries
+
+def exact_top_k(ids, vectors, queries, k, batch_size=256):
+    results = []
+    for start in range(0, len(queries), batch_size):
+        scores = queries[start:start + batch_size] @ vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results.extend(set(ids[row].tolist()) for row in top)
+    return results
+
+def evaluate(index, queries, expected, k):
+    latencies = []
+    recalls = []
+    for query, truth in zip(queries, expected):
+        start = time.perf_counter()
+        found, _ = index.search(query, k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(truth & set(found.tolist())) / k)
+    return np.mean(recalls), np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+def parse_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="近似最近鄰索引 recall/延遲/記憶體評估")
+    parser.add_argument("--db", type=str, help="使用資料庫中已儲存的詞向量（未提供時使用合成資料）")
+    parser.add_argument("--size", type=int, default=200000, help="合成資料的向量數")
+    parser.add_argument("--dim", type=int, default=384, help="合成資料的維度")
+    parser.add_argument("--queries", type=int, default=1000, help="查詢數")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--index-types", type=str, default="flat,hnsw,ivfpq", help="以逗號分隔的索引類型")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW每個節點的鄰居數")
+    parser.add_argument("--ef-construction", type=int, default=200, help="HNSW建圖時的候選數")
+    parser.add_argument("--ef-search", type=str, default="16,32,64,128,256", help="以逗號分隔的HNSW efSearch")
+    parser.add_argument("--nlist", type=int, help="IVF分群數（預設約 4*sqrt(n)）")
+    parser.add_argument("--nprobe", type=str, default="1,4,16,64", help="以逗號分隔的IVF nprobe")
+    parser.add_argument("--pq-m", type=str, help="以逗號分隔的PQ編碼位元組數（預設約 維度/8）")
+    parser.add_argument("--remove-fraction", type=float, default=0.04,
+                        help="建立後刪除的向量比例，再測一次（預設略低於HNSW重建門檻；0 表示不測）")
+    parser.add_argument("--threads", type=int, default=1, help="faiss查詢執行緒數（單筆查詢延遲通常以1測量）")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    import faiss
+    build_threads = faiss.omp_get_max_threads()
+    
+    ids, vectors, queries = load_corpus(args)
+    if len(ids) <= args.k:
+        print("詞向量數量不足，無法評估")
+        return
+    dim = vectors.shape[1]
+    expected = exact_top_k(ids, vectors, queries, args.k)
+    
+    # 刪除後的正確答案以剩餘的向量重新計算
+    removed_ids = np.array([], dtype=np.int64)
+    if args.remove_fraction > 0:
+        removed = np.random.default_rng(2).random(len(ids)) < args.remove_fraction
+        removed_ids = ids[removed]
+        expected_after_removal = exact_top_k(ids[~removed], vectors[~removed], queries, args.k)
+    
+    configs = []
+    for index_type in args.index_types.split(","):
+        index_type = index_type.strip()
+        if index_type == "flat":
+            configs.append(("flat", {}, [("-", {})]))
+        elif index_type == "hnsw":
+            configs.append(("hnsw", {'hnsw_m': args.hnsw_m, 'ef_construction': args.ef_construction},
+                            [(f"ef={ef}", {'ef_search': ef}) for ef in parse_list(args.ef_search)]))
+        elif index_type == "ivfpq":
+            for pq_m in (parse_list(args.pq_m) if args.pq_m else [None]):
+                configs.append(("ivfpq", {'nlist': args.nlist, 'pq_m': pq_m},
+                                [(f"nprobe={nprobe}", {'nprobe': nprobe}) for nprobe in parse_list(args.nprobe)]))
+    
+    print(f"資料來源: {args.db or '合成資料'}，{len(ids)} 個向量，維度 {dim}，查詢 {len(queries)} 筆，執行緒 {args.threads}")
+    print(f"{'索引':<18}{'查詢參數':<14}{f'recall@{args.k}':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'記憶體(MB)':>12}{'建立(秒)':>10}")
+    print("-" * 84)
+    
+    for index_type, build_options, search_options in configs:
+        # 建立索引時使用所有核心，查詢延遲以 --threads 測量
+        faiss.omp_set_num_threads(build_threads)
+        start = time.perf_counter()
+        index = VectorIndex(dim, index_type, **{name: value for name, value in build_options.items() if value is not None})
+        index.add(ids, vectors)
+        build_time = time.perf_counter() - start
+        memory = index.memory_bytes / 2**20
+        faiss.omp_set_num_threads(args.threads)
+        
+        label = index.index_type
+        if index.index_type == "hnsw":
+            label = f"hnsw M={index.hnsw_m}"
+        elif index.index_type == "ivfpq" and not index.trained:
+            label = "ivfpq (未訓練)"
+        elif index.index_type == "ivfpq":
+            label = f"ivfpq {index.nlist}x{index.pq_m}B"
+        
+        for search_label, params in search_options:
+            index.set_search_params(**params)
+            recall, p50, p99 = evaluate(index, queries, expected, args.k)
+            print(f"{label:<18}{search_label:<14}{recall:>10.3f}{p50:>10.3f}{p99:>10.3f}{memory:>12.1f}{build_time:>10.1f}")
+        
+        if len(removed_ids):
+            start = time.perf_counter()
+            index.remove(removed_ids)
+            remove_time = time.perf_counter() - start
+            label = f"{label} -{args.remove_fraction:.0%}"
+            for search_label, params in search_options:
+                index.set_search_params(**params)
+                recall, p50, p99 = evaluate(index, queries, expected_after_removal, args.k)
+                print(f"{label:<18}{search_label:<14}{recall:>10.3f}{p50:>10.3f}{p99:>10.3f}{index.memory_bytes / 2**20:>12.1f}{remove_time:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#coding=utf-8
+# 評估PCA降維後的檢索recall@k：以全維度內積搜尋的前k名為基準，比較不同目標維度的召回率與索引記憶體
+import os
+import sys
+import argparse
+import logging
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_reducer import PCAReducer
+from vector_processor import VectorProcessor
+
+def make_synthetic_vectors(size, dim, latent_dim=48, noise=0.3, seed=0):
+    # 沒有資料庫時的合成語料：低秩結構加雜訊，近似句向量集中在少數方向的分佈
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((latent_dim, dim)).astype(np.float32)
+    latent = rng.standard_normal((size, latent_dim)).astype(np.float32)
+    vectors = latent @ basis + noise * np.sqrt(latent_dim) * rng.standard_normal((size, dim)).astype(np.float32)
+    return VectorProcessor.normalize_rows(vectors)
+
+def top_k(matrix, queries, query_ids, k):
+    scores = queries @ matrix.T
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf  # 排除查詢本身
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description="PCA降維檢索recall評估")
+    parser.add_argument("--db", type=str, help="使用資料庫中已儲存的全維度詞向量（未提供時使用合成資料）")
+    parser.add_argument("--size", type=int, default=50000, help="合成資料的向量數")
+    parser.add_argument("--dim", type=int, default=384, help="合成資料的原始維度")
+    parser.add_argument("--dims", type=str, default="32,64,96,128,192", help="以逗號分隔的目標維度")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    parser.add_argument("--queries", type=int, default=500, help="查詢數")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    if args.db:
+        from database_manager import DatabaseManager
+        with DatabaseManager(args.db) as db_manager:
+            vectors = VectorProcessor.normalize_rows(db_manager.get_vector_matrix())
+        source = args.db
+    else:
+        vectors = make_synthetic_vectors(args.size, args.dim)
+        source = "合成資料"
+    
+    if len(vectors) <= args.k:
+        print("詞向量數量不足，無法評估")
+        return
+    
+    query_ids = np.random.default_rng(1).choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    expected = top_k(vectors, vectors[query_ids], query_ids, args.k)
+    full_bytes = vectors.nbytes
+    
+    print(f"資料來源: {source}，{len(vectors)} 個向量，原始維度 {vectors.shape[1]}，查詢 {len(query_ids)} 筆")
+    print(f"{'維度':>6}{'保留變異量':>12}{f'recall@{args.k}':>12}{'索引大小(MB)':>14}{'縮小倍數':>10}")
+    print("-" * 54)
+    print(f"{vectors.shape[1]:>6}{1.0:>12.1%}{1.0:>12.3f}{full_bytes / 2**20:>14.1f}{1.0:>9.1f}x")
+    
+    for dim in [int(value) for value in args.dims.split(",")]:
+        if dim >= vectors.shape[1]:
+            continue
+        reducer = PCAReducer(path=None).fit(vectors, dim)
+        reduced = reducer.transform(vectors)
+        found = top_k(reduced, reduced[query_ids], query_ids, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, expected)])
+        print(f"{dim:>6}{reducer.explained_variance_ratio:>12.1%}{recall:>12.3f}"
+              f"{reduced.nbytes / 2**20:>14.1f}{full_bytes / reduced.nbytes:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
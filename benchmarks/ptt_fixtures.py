@@ -0,0 +1,132 @@
+#coding=utf-8
+# 產生PTT格式的合成索引頁與文章頁，供效能測試使用
+import random
+
+INDEX_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>看板 {board} 文章列表 - 批踢踢實業坊</title>
+</head>
+<body>
+<div id="topbar-container"><div id="topbar" class="bbs-content"><a id="logo" href="/bbs/">批踢踢實業坊</a></div></div>
+<div id="action-bar-container">
+<div class="action-bar">
+<div class="btn-group btn-group-paging">
+<a class="btn wide" href="/bbs/{board}/index1.html">最舊</a>
+{prev_link}
+<a class="btn wide disabled">下頁 &rsaquo;</a>
+<a class="btn wide" href="/bbs/{board}/index.html">最新</a>
+</div>
+</div>
+</div>
+<div id="main-container">
+<div class="r-list-container action-bar-margin bbs-screen">
+{entries}
+</div>
+</div>
+</body>
+</html>
+'''
+
+ENTRY_TEMPLATE = '''<div class="r-ent">
+<div class="nrec"><span class="hl f3">{push}</span></div>
+<div class="title">
+<a href="/bbs/{board}/{article_id}.html">{title}</a>
+</div>
+<div class="meta">
+<div class="author">{author}</div>
+<div class="article-menu"></div>
+<div class="date"> {date}</div>
+</div>
+</div>
+'''
+
+DELETED_ENTRY_TEMPLATE = '''<div class="r-ent">
+<div class="nrec"></div>
+<div class="title">
+(本文已被刪除) [{author}]
+</div>
+<div class="meta">
+<div class="author">-</div>
+<div class="date"> {date}</div>
+</div>
+</div>
+'''
+
+ARTICLE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title} - 看板 {board} - 批踢踢實業坊</title>
+</head>
+<body>
+<div id="main-container">
+<div id="main-content" class="bbs-screen bbs-content"><div class="article-metaline"><span class="article-meta-tag">作者</span><span class="article-meta-value">{author} ({author})</span></div><div class="article-metaline-right"><span class="article-meta-tag">看板</span><span class="article-meta-value">{board}</span></div><div class="article-metaline"><span class="article-meta-tag">標題</span><span class="article-meta-value">{title}</span></div><div class="article-metaline"><span class="article-meta-tag">時間</span><span class="article-meta-value">Mon Jan  1 12:00:00 2024</span></div>
+{body}
+--
+<span class="f2">※ 發信站: 批踢踢實業坊(ptt.cc), 來自: 1.2.3.4 (臺灣)
+</span><span class="f2">※ 文章網址: <a href="https://www.ptt.cc/bbs/{board}/{article_id}.html" target="_blank" rel="noopener noreferrer nofollow">https://www.ptt.cc/bbs/{board}/{article_id}.html</a>
+</span>{pushes}</div>
+</div>
+</body>
+</html>
+'''
+
+PUSH_TEMPLATE = '''<div class="push"><span class="hl push-tag">推 </span><span class="f3 hl push-userid">{user}</span><span class="f3 push-content">: {text}</span><span class="push-ipdatetime"> 01/01 12:{minute:02d}
+</span></div>'''
+
+WORDS = ['八卦', '天氣', '颱風', '政府', '台北', '高雄', '新聞', '股票', '房價', '薪水',
+         '便當', '捷運', '選舉', '疫情', '電價', '油價', '手機', '遊戲', '棒球', '演唱會']
+
+def make_sentence(rng, min_words=4, max_words=12):
+    return ''.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) + rng.choice('。！？，')
+
+def make_title(rng):
+    return f"[{rng.choice(['問卦', '新聞', '爆卦', '協尋'])}] {make_sentence(rng, 2, 5)}"
+
+def article_id_for(board, page_no, index):
+    return f"M.{1700000000 + page_no * 100 + index}.A.{page_no:03X}"
+
+def make_index_page(board='Gossiping', page_no=39000, entries=20, seed=None, deleted_ratio=0.05):
+    rng = random.Random(seed if seed is not None else page_no)
+    
+    rows = []
+    for i in range(entries):
+        author = f"user{rng.randint(1, 5000)}"
+        date = f"{rng.randint(1, 12)}/{rng.randint(1, 28):02d}"
+        if rng.random() < deleted_ratio:
+            rows.append(DELETED_ENTRY_TEMPLATE.format(author=author, date=date))
+            continue
+        rows.append(ENTRY_TEMPLATE.format(
+            board=board,
+            article_id=article_id_for(board, page_no, i),
+            title=make_title(rng),
+            author=author,
+            date=date,
+            push=rng.randint(0, 99)
+        ))
+    
+    if page_no > 1:
+        prev_link = f'<a class="btn wide" href="/bbs/{board}/index{page_no - 1}.html">&lsaquo; 上頁</a>'
+    else:
+        prev_link = '<a class="btn wide disabled">&lsaquo; 上頁</a>'
+    
+    return INDEX_TEMPLATE.format(board=board, prev_link=prev_link, entries=''.join(rows))
+
+def make_article_page(board='Gossiping', article_id='M.1700000000.A.000', paragraphs=8, pushes=30, seed=None):
+    rng = random.Random(seed if seed is not None else article_id)
+    
+    body = '\n\n'.join(''.join(make_sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(paragraphs))
+    push_html = ''.join(
+        PUSH_TEMPLATE.format(user=f"user{rng.randint(1, 5000)}", text=make_sentence(rng, 1, 4), minute=i % 60)
+        for i in range(pushes)
+    )
+    return ARTICLE_TEMPLATE.format(
+        board=board,
+        article_id=article_id,
+        title=make_title(rng),
+        author=f"user{rng.randint(1, 5000)}",
+        body=body,
+        pushes=push_html
+    )
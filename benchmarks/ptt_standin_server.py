@@ -0,0 +1,122 @@
+#coding=utf-8
+# 本機PTT替身伺服器：提供合成的索引頁與文章頁，可設定延遲與錯誤注入，供離線效能測試使用
+import re
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from ptt_fixtures import make_index_page, make_article_page
+
+INDEX_PATTERN = re.compile(r'^/bbs/(\w+)/index(\d*)\.html$')
+ARTICLE_PATTERN = re.compile(r'^/bbs/(\w+)/(M\.\d+\.A\.[0-9A-F]+)\.html$')
+
+class PTTStandinServer:
+    def __init__(self, host='127.0.0.1', port=0, latest_page=39000, entries_per_page=20,
+                 latency=0.05, jitter=0.02, error_rate=0.0, seed=0):
+        
+        self.latest_page = latest_page #latest_page: 最新索引頁編號（index.html 對應的頁數）
+        self.entries_per_page = entries_per_page #entries_per_page: 每頁文章數
+        self.latency = latency #latency: 每個請求的基本延遲秒數
+        self.jitter = jitter #jitter: 延遲的隨機抖動秒數
+        self.error_rate = error_rate #error_rate: 隨機回應503的比例
+        self.request_count = 0
+        self.error_count = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+    
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_GET(self):
+                server.handle_request(self)
+        
+        return Handler
+    
+    def render(self, path):
+        match = INDEX_PATTERN.match(path)
+        if match:
+            page_no = int(match.group(2)) if match.group(2) else self.latest_page
+            if not 1 <= page_no <= self.latest_page:
+                return None
+            return make_index_page(match.group(1), page_no, self.entries_per_page)
+        
+        match = ARTICLE_PATTERN.match(path)
+        if match:
+            return make_article_page(match.group(1), match.group(2))
+        
+        return None
+    
+    def handle_request(self, handler):
+        with self._lock:
+            self.request_count += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            inject_error = self._rng.random() < self.error_rate
+            if inject_error:
+                self.error_count += 1
+        
+        time.sleep(delay)
+        
+        if inject_error:
+            status, body = 503, 'Service Unavailable'
+        else:
+            body = self.render(handler.path.split('?')[0])
+            status = 200 if body is not None else 404
+            body = body if body is not None else 'Not Found'
+        
+        data = body.encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/html; charset=utf-8')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="本機PTT替身伺服器")
+    parser.add_argument("--port", type=int, default=8080, help="監聽埠號")
+    parser.add_argument("--latency", type=float, default=0.05, help="每個請求的延遲秒數")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="隨機回應503的比例")
+    args = parser.parse_args()
+    
+    server = PTTStandinServer(port=args.port, latency=args.latency, error_rate=args.error_rate)
+    print(f"PTT替身伺服器已啟動: {server.base_url}/bbs/Gossiping/index.html")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n伺服器已關閉")
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,91 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import logging
+import re
 import json
-from typing import List, Dict, Any
+import struct
+import zlib
+from typing import List, Dict, Any, Set, Iterable, Iterator, Optional, Callable, Tuple
+
+# 詞向量以 float32 BLOB 儲存，前置12位元組標頭：
+#   magic(2) 版本(1) 旗標(1，bit0=已正規化) 維度(4) 模型名稱CRC32(4)
+VECTOR_MAGIC = b'PV'
+VECTOR_FORMAT_VERSION = 1
+# article_vectors.version 為 0 表示從舊版 articles 欄位遷移而來、正規化與否不明的詞向量
+# 只有這些列會被 normalize_legacy_vectors 正規化；刻意以 normalize_embeddings=False 寫入的詞向量不受影響
+LEGACY_VECTOR_VERSION = 0
+VECTOR_HEADER = struct.Struct('<2sBBII')
+VECTOR_FLAG_NORMALIZED = 1
+
+def model_tag(model_name: str) -> int:
+    return zlib.crc32(model_name.encode('utf-8')) if model_name else 0
+
+def encode_vector(vector, normalized: bool = False, model_name: str = "", tag: Optional[int] = None) -> Optional[bytes]:
+    # 將詞向量編碼為含標頭的 float32 BLOB；None 維持 NULL
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    flags = VECTOR_FLAG_NORMALIZED if normalized else 0
+    header = VECTOR_HEADER.pack(VECTOR_MAGIC, VECTOR_FORMAT_VERSION, flags, vector.shape[0],
+                                model_tag(model_name) if tag is None else tag)
+    return header + vector.tobytes()
+
+def decode_vector(value) -> np.ndarray:
+    # 讀取 BLOB 時以 np.frombuffer 直接取得陣列（不複製）；舊版 JSON 文字仍可讀取
+    if value is None:
+        return np.zeros(0, dtype=np.float32)
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=np.float32)
+    magic, _, _, dim, _ = VECTOR_HEADER.unpack_from(value)
+    if magic != VECTOR_MAGIC:
+        raise ValueError("未知的詞向量格式")
+    return np.frombuffer(value, dtype=np.float32, count=dim, offset=VECTOR_HEADER.size)
+
+def decode_vector_batch(values: List[Any], dim: Optional[int] = None) -> np.ndarray:
+    # 將多個詞向量 BLOB 解碼為 float32 矩陣；長度一致時串接後一次 np.frombuffer，不逐列建立陣列
+    # 維度與 dim（未提供時取第一筆）不符或為 NULL 的列補零
+    if not values:
+        return np.zeros((0, dim or 0), dtype=np.float32)
+    
+    lengths = {len(value) if isinstance(value, bytes) else -1 for value in values}
+    if len(lengths) == 1 and -1 not in lengths:
+        stride = lengths.pop()
+        header_floats = VECTOR_HEADER.size // 4
+        matrix = np.frombuffer(b''.join(values), dtype=np.float32).reshape(len(values), stride // 4)[:, header_floats:]
+        if dim is None or matrix.shape[1] == dim:
+            return matrix
+    
+    vectors = [decode_vector(value) for value in values]
+    if dim is None:
+        dim = next((vector.size for vector in vectors if vector.size), 0)
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+    for row, vector in enumerate(vectors):
+        if vector.size == dim:
+            matrix[row] = vector
+    return matrix
+
+def read_vector_header(value) -> Dict[str, Any]:
+    magic, version, flags, dim, tag = VECTOR_HEADER.unpack_from(value)
+    if magic != VECTOR_MAGIC:
+        raise ValueError("未知的詞向量格式")
+    return {'version': version, 'normalized': bool(flags & VECTOR_FLAG_NORMALIZED), 'dim': dim, 'model_tag': tag}
+
+# 連線調校：WAL 讓讀取不被寫入阻擋，且每次交易只需追加寫入WAL檔；synchronous=NORMAL 在WAL模式下
+# 只在檢查點時 fsync，斷電最多遺失最後幾筆交易但不會損毀資料庫
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,      # 64MB 頁面快取（負值單位為KB）
+    'mmap_size': 268435456,    # 256MB 記憶體映射讀取
+    'temp_store': 'MEMORY'
+}
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "ptt_articles.db"):
+    def __init__(self, db_path: str = "ptt_articles.db", write_batch_size: int = 1000):
         self.db_path = db_path
+        self.write_batch_size = write_batch_size #write_batch_size: 批次寫入時每個交易的列數
         self.conn = None
+        self.fts_enabled = False
         self.setup_logging()
         self.init_database()
     
@@ -21,13 +99,33 @@ class DatabaseManager:
     def init_database(self):
 
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # 多行程同時寫入時等待鎖定釋放，而非立即失敗
+            self.conn = sqlite3.connect(self.db_path, timeout=30)
+            self.configure_connection()
             self.create_tables()
             self.logger.info("資料庫初始化完成")
         except Exception as e:
             self.logger.error(f"資料庫初始化失敗: {e}")
             raise
     
+    def configure_connection(self):
+        cursor = self.conn.cursor()
+        for name, value in CONNECTION_PRAGMAS.items():
+            try:
+                cursor.execute(f'PRAGMA {name} = {value}')
+            except sqlite3.DatabaseError as e:
+                self.logger.warning(f"無法設定 PRAGMA {name}: {e}")
+        
+        journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        expected_mode = CONNECTION_PRAGMAS.get('journal_mode')
+        if expected_mode and journal_mode.lower() != expected_mode.lower():
+            self.logger.warning(f"資料庫未能切換為WAL模式，目前為: {journal_mode}")
+    
+    @staticmethod
+    def iter_batches(items: List[Any], batch_size: int) -> Iterable[List[Any]]:
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+    
     def create_tables(self):
         cursor = self.conn.cursor()
         
@@ -40,79 +138,793 @@ class DatabaseManager:
                 date TEXT,
                 content TEXT,
                 url TEXT UNIQUE,
-                title_vector TEXT,
-                content_vector TEXT,
+                board TEXT DEFAULT 'Gossiping',
+                chunks_indexed INTEGER DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # 舊版資料表沒有看板欄位，補上並視為八卦版文章
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(articles)').fetchall()]
+        if 'board' not in columns:
+            cursor.execute("ALTER TABLE articles ADD COLUMN board TEXT DEFAULT 'Gossiping'")
+            self.logger.info("已為文章資料表新增看板欄位")
+        
+        # 舊版文章沒有片段詞向量，標記為未建立，下次計算詞向量時補上
+        if 'chunks_indexed' not in columns:
+            cursor.execute("ALTER TABLE articles ADD COLUMN chunks_indexed INTEGER DEFAULT 0")
+            self.logger.info("已為文章資料表新增片段索引欄位")
+        
         #索引
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_url ON articles(url)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_board ON articles(board)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_title ON articles(title)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON articles(date)')
         
+        # 文章詞向量獨立成表，檢索時只需讀取向量而不必掃過內文；model/version 記錄計算時的模型與向量格式
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_vectors (
+                article_id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL DEFAULT '',
+                version INTEGER NOT NULL DEFAULT {version},
+                normalized INTEGER DEFAULT 0,
+                title_vector BLOB,
+                content_vector BLOB,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        '''.format(version=VECTOR_FORMAT_VERSION))
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vectors_updated ON article_vectors(updated_at)')
+        
+        # 文章標題或內文改變時原本的詞向量失效，刪除後由下次計算詞向量時補上
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS article_vectors_invalidate AFTER UPDATE OF title, content ON articles
+            WHEN old.title IS NOT new.title OR old.content IS NOT new.content BEGIN
+                DELETE FROM article_vectors WHERE article_id = old.id;
+            END
+        ''')
+        
+        # 內文改變時舊片段的字元位置已不對應新內文，一併刪除，由重算詞向量時重新切分
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS article_chunks_invalidate AFTER UPDATE OF content ON articles
+            WHEN old.content IS NOT new.content BEGIN
+                DELETE FROM article_chunks WHERE article_id = old.id;
+            END
+        ''')
+        
+        # 詞向量被刪除（內容變更、清理舊文章、清除詞向量）時留下紀錄，常駐索引據此移除對應的文章
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS vector_tombstones (
+                article_id INTEGER PRIMARY KEY,
+                removed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tombstones_removed ON vector_tombstones(removed_at)')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS article_vectors_tombstone AFTER DELETE ON article_vectors BEGIN
+                INSERT OR REPLACE INTO vector_tombstones (article_id, removed_at) VALUES (old.article_id, CURRENT_TIMESTAMP);
+            END
+        ''')
+        
+        # 內文片段與其詞向量，start_offset/end_offset 為片段在文章內文中的字元位置
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                start_offset INTEGER NOT NULL,
+                end_offset INTEGER NOT NULL,
+                vector BLOB,
+                vector_normalized INTEGER DEFAULT 0,
+                UNIQUE(article_id, chunk_index)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chunk_article ON article_chunks(article_id)')
+        
+        # 爬取檢查點，供長時間回補中斷後繼續
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+                name TEXT PRIMARY KEY,
+                current_url TEXT,
+                pages_done INTEGER,
+                pending_urls TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 資料庫層級的設定，例如已儲存的詞向量以哪一組PCA參數降維
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
         self.conn.commit()
+        self.create_fts_index()
         self.logger.info("資料表建立完成")
+        
+        # 資料庫格式版本：1 = 詞向量改為 float32 BLOB；2 = 文章詞向量移至 article_vectors 資料表
+        # 3 = 遷移而來的舊詞向量以 version = LEGACY_VECTOR_VERSION 標記
+        user_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if user_version < 2:
+            migrated_count = 0
+            if user_version < 1:
+                migrated_count += self.migrate_vectors_to_blob()
+            migrated_count += self.migrate_vectors_to_table()
+            cursor.execute('PRAGMA user_version = 3')
+            self.conn.commit()
+            if migrated_count:
+                self.logger.info("正在回收資料庫空間...")
+                self.conn.execute('VACUUM')
+        elif user_version < 3:
+            # 格式2遷移時未標記舊詞向量；當時遷移的列沒有記錄模型名稱
+            cursor.execute('''
+                UPDATE article_vectors SET version = ?
+                WHERE model = '' AND COALESCE(normalized, 0) = 0
+            ''', (LEGACY_VECTOR_VERSION,))
+            cursor.execute('PRAGMA user_version = 3')
+            self.conn.commit()
+    
+    def create_fts_index(self):
+        # 以 FTS5 trigram 建立標題與內文的全文索引（中文子字串可直接比對），由觸發器與文章資料表保持同步
+        # SQLite 未編譯 FTS5 或版本不支援 trigram 時停用，關鍵字搜尋退回 LIKE
+        cursor = self.conn.cursor()
+        try:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'"
+            ).fetchone()
+            
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                    title, content,
+                    content='articles', content_rowid='id',
+                    tokenize='trigram'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+                    INSERT INTO articles_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+                    INSERT INTO articles_fts(articles_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF title, content ON articles BEGIN
+                    INSERT INTO articles_fts(articles_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                    INSERT INTO articles_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                END
+            ''')
+            
+            # 既有資料庫第一次建立索引時，為已儲存的文章建立全文索引
+            if not exists:
+                cursor.execute("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')")
+                self.logger.info("已建立文章全文索引")
+            
+            self.conn.commit()
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            self.conn.rollback()
+            self.fts_enabled = False
+            self.logger.warning(f"無法建立FTS5全文索引，關鍵字搜尋將使用LIKE: {e}")
     
-    def insert_articles(self, articles: List[Dict[str, Any]]) -> int:
+    def insert_articles(self, articles: List[Dict[str, Any]], replace: bool = False,
+                        batch_size: Optional[int] = None) -> int:
 
+        # replace=True 時以新解析的內容覆寫既有文章（例如從頁面快取重播後重建語料），內容有變的文章由觸發器清除詞向量後重算
+        # 每 batch_size 篇以一次 executemany 在同一個交易中寫入
         if not articles:
             return 0
         
+        if replace:
+            sql = '''
+                INSERT INTO articles 
+                (title, author, date, content, url, board) 
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    board = excluded.board,
+                    author = excluded.author,
+                    date = excluded.date,
+                    content = excluded.content,
+                    chunks_indexed = CASE WHEN articles.content = excluded.content
+                                          THEN articles.chunks_indexed ELSE 0 END,
+                    updated_at = CURRENT_TIMESTAMP
+            '''
+        else:
+            sql = '''
+                INSERT OR IGNORE INTO articles 
+                (title, author, date, content, url, board) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            '''
+        
+        def article_row(article):
+            return (
+                article.get('title', ''),
+                article.get('author', ''),
+                article.get('date', ''),
+                article.get('content', ''),
+                article.get('url', ''),
+                article.get('board', 'Gossiping')
+            )
+        
         cursor = self.conn.cursor()
         inserted_count = 0
         
-        for article in articles:
+        for batch in self.iter_batches(articles, batch_size or self.write_batch_size):
             try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO articles 
-                    (title, author, date, content, url) 
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    article.get('title', ''),
-                    article.get('author', ''),
-                    article.get('date', ''),
-                    article.get('content', ''),
-                    article.get('url', '')
-                ))
-                
-                if cursor.rowcount > 0:
-                    inserted_count += 1
-                    
+                # executemany 的 rowcount 為整批實際寫入的列數（被忽略的重複網址不計）
+                cursor.executemany(sql, [article_row(article) for article in batch])
+                inserted_count += cursor.rowcount
+                self.conn.commit()
             except Exception as e:
-                self.logger.error(f"插入文章失敗: {article.get('title', '')}, 錯誤: {e}")
-                continue
+                # 整批失敗時回滾並逐篇重試，只略過有問題的文章
+                self.conn.rollback()
+                self.logger.error(f"批次插入文章失敗，改為逐篇插入: {e}")
+                for article in batch:
+                    try:
+                        cursor.execute(sql, article_row(article))
+                        inserted_count += max(cursor.rowcount, 0)
+                    except Exception as e:
+                        self.logger.error(f"插入文章失敗: {article.get('title', '')}, 錯誤: {e}")
+                self.conn.commit()
         
-        self.conn.commit()
         self.logger.info(f"成功插入 {inserted_count} 篇新文章")
         return inserted_count
     
-    def update_vectors(self, article_id: int, title_vector: List[float], content_vector: List[float]):
+    def insert_articles_stream(self, articles: Iterable[Dict[str, Any]], batch_size: int = 100,
+                               replace: bool = False, on_commit: Optional[Callable[[], None]] = None) -> int:
+
+        # 邊爬邊寫：每累積 batch_size 篇就以一個交易寫入，中途中斷也不會遺失已寫入的批次
+        # on_commit: 每批寫入後呼叫（例如儲存爬取檢查點）
+        inserted_count = 0
+        batch = []
+        
+        for article in articles:
+            batch.append(article)
+            if len(batch) >= batch_size:
+                inserted_count += self.insert_articles(batch, replace=replace)
+                batch = []
+                if on_commit:
+                    on_commit()
+        
+        if batch:
+            inserted_count += self.insert_articles(batch, replace=replace)
+        if on_commit:
+            on_commit()
+        
+        return inserted_count
+    
+    def save_crawl_checkpoint(self, name: str, state: Dict[str, Any]):
 
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
-                UPDATE articles 
-                SET title_vector = ?, content_vector = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
+                INSERT OR REPLACE INTO crawl_checkpoints
+                (name, current_url, pages_done, pending_urls, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
             ''', (
-                json.dumps(title_vector),
-                json.dumps(content_vector),
-                article_id
+                name,
+                state.get('current_url'),
+                state.get('pages_done', 0),
+                json.dumps(state['pending_urls']) if state.get('pending_urls') is not None else None
             ))
             self.conn.commit()
         except Exception as e:
-            self.logger.error(f"更新詞向量失敗: article_id={article_id}, 錯誤: {e}")
+            self.logger.error(f"儲存爬取檢查點失敗: {name}, 錯誤: {e}")
     
-    def get_articles_without_vectors(self) -> List[Dict[str, Any]]:
+    def load_crawl_checkpoint(self, name: str) -> Optional[Dict[str, Any]]:
 
         cursor = self.conn.cursor()
         cursor.execute('''
-            SELECT id, title, content 
-            FROM articles 
-            WHERE title_vector IS NULL OR content_vector IS NULL
-        ''')
+            SELECT current_url, pages_done, pending_urls, updated_at
+            FROM crawl_checkpoints
+            WHERE name = ?
+        ''', (name,))
+        
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        return {
+            'current_url': row[0],
+            'pages_done': row[1],
+            'pending_urls': json.loads(row[2]) if row[2] is not None else None,
+            'updated_at': row[3]
+        }
+    
+    def clear_crawl_checkpoint(self, name: str):
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM crawl_checkpoints WHERE name = ?', (name,))
+        self.conn.commit()
+    
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM db_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_meta(self, values: Dict[str, Any], commit: bool = True):
+        # 值為 None 的鍵會被刪除
+        cursor = self.conn.cursor()
+        cursor.executemany('INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?)',
+                           [(key, str(value)) for key, value in values.items() if value is not None])
+        cursor.executemany('DELETE FROM db_meta WHERE key = ?',
+                           [(key,) for key, value in values.items() if value is None])
+        if commit:
+            self.conn.commit()
+    
+    @staticmethod
+    def vector_reduction_meta(reducer=None) -> Dict[str, Any]:
+        # reducer: 已擬合的 PCAReducer，None 表示詞向量未降維
+        if reducer is None:
+            return {'pca_path': None, 'pca_dim': None, 'pca_fingerprint': None}
+        return {'pca_path': reducer.path, 'pca_dim': reducer.output_dim, 'pca_fingerprint': reducer.fingerprint}
+    
+    def check_vector_reduction(self, reducer=None):
+        # 確認寫入或查詢詞向量時使用的PCA參數與資料庫中已儲存的詞向量一致，不一致時拋出 ValueError
+        # 資料庫中還沒有詞向量時，記錄本次的設定
+        stored_dim = int(self.get_meta('pca_dim') or 0)
+        stored_path = self.get_meta('pca_path')
+        has_vectors = self.conn.execute('SELECT EXISTS (SELECT 1 FROM article_vectors)').fetchone()[0]
+        
+        if not has_vectors:
+            self.set_meta(self.vector_reduction_meta(reducer))
+            return
+        
+        if reducer is None and stored_dim:
+            raise ValueError(f"資料庫中的詞向量已以PCA參數檔 {stored_path} 降維為 {stored_dim} 維，"
+                             f"請以 --pca-path 指定同一個參數檔，或以 --reembed 重新計算詞向量")
+        if reducer is not None and not stored_dim:
+            raise ValueError(f"資料庫中的詞向量未降維，不能使用PCA參數檔 {reducer.path}；"
+                             f"請移除 --pca-path，或以 --action pca 將既有詞向量降維")
+        if reducer is not None and reducer.fingerprint != self.get_meta('pca_fingerprint'):
+            raise ValueError(f"PCA參數檔 {reducer.path}（{reducer.output_dim} 維）與資料庫中詞向量降維時使用的 "
+                             f"{stored_path}（{stored_dim} 維）不同")
+    
+    def get_existing_urls(self, urls: List[str], chunk_size: int = 500) -> Set[str]:
+
+        # 批次查詢哪些網址已存在資料庫，供增量爬取略過已儲存的文章
+        existing = set()
+        if not urls:
+            return existing
+        
+        cursor = self.conn.cursor()
+        unique_urls = list(dict.fromkeys(urls))
+        for start in range(0, len(unique_urls), chunk_size):
+            chunk = unique_urls[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT url FROM articles WHERE url IN ({placeholders})', chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+        
+        return existing
+    
+    def update_vectors(self, article_id: int, title_vector: List[float], content_vector: List[float],
+                       normalized: bool = False, model_name: str = ""):
+
+        # normalized: 詞向量是否已L2正規化，檢索時據此決定能否直接以內積計算相似度
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO article_vectors
+                (article_id, model, version, normalized, title_vector, content_vector, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (
+                article_id,
+                model_name,
+                VECTOR_FORMAT_VERSION,
+                int(normalized),
+                encode_vector(title_vector, normalized, model_name),
+                encode_vector(content_vector, normalized, model_name)
+            ))
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"更新詞向量失敗: article_id={article_id}, 錯誤: {e}")
+    
+    def update_vectors_batch(self, results: List[Dict[str, Any]], normalized: bool = False, model_name: str = "",
+                             batch_size: Optional[int] = None) -> int:
+
+        # 以 executemany 寫入多篇文章的詞向量，每 batch_size 篇一個交易，供平行計算時由單一寫入者寫回
+        # 結果含 'chunks' 時一併取代該文章的內文片段詞向量
+        # model_name: 記錄在 article_vectors.model 與詞向量標頭中，用來辨識不同模型算出的向量
+        batch_size = batch_size or self.write_batch_size
+        if len(results) > batch_size:
+            return sum(self.update_vectors_batch(batch, normalized, model_name, batch_size)
+                       for batch in self.iter_batches(results, batch_size))
+        
+        tag = model_tag(model_name)
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO article_vectors
+                (article_id, model, version, normalized, title_vector, content_vector, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', [
+                (
+                    result['id'],
+                    model_name,
+                    VECTOR_FORMAT_VERSION,
+                    int(normalized),
+                    encode_vector(result['title_vector'], normalized, tag=tag),
+                    encode_vector(result['content_vector'], normalized, tag=tag)
+                )
+                for result in results
+            ])
+            
+            chunk_results = [result for result in results if 'chunks' in result]
+            if chunk_results:
+                cursor.executemany('DELETE FROM article_chunks WHERE article_id = ?',
+                                   [(result['id'],) for result in chunk_results])
+                cursor.executemany('''
+                    INSERT INTO article_chunks
+                    (article_id, chunk_index, start_offset, end_offset, vector, vector_normalized)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [
+                    (result['id'], chunk['chunk_index'], chunk['start'], chunk['end'],
+                     encode_vector(chunk['vector'], normalized, tag=tag), int(normalized))
+                    for result in chunk_results
+                    for chunk in result['chunks']
+                ])
+                cursor.executemany('UPDATE articles SET chunks_indexed = 1 WHERE id = ?',
+                                   [(result['id'],) for result in chunk_results])
+            
+            self.conn.commit()
+            return len(results)
+        except Exception as e:
+            self.conn.rollback()
+            self.logger.error(f"批次更新詞向量失敗: {e}")
+            return 0
+    
+    def clear_vectors(self) -> int:
+
+        # 更換詞向量模型時清除所有既有詞向量，讓所有文章重新計算
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM article_vectors')
+        cleared_count = cursor.rowcount
+        cursor.execute('UPDATE articles SET chunks_indexed = 0 WHERE chunks_indexed = 1')
+        cursor.execute('DELETE FROM article_chunks')
+        self.conn.commit()
+        self.logger.info(f"已清除 {cleared_count} 篇文章的詞向量")
+        return cleared_count
+    
+    def normalize_legacy_vectors(self, batch_size: int = 1000) -> int:
+
+        # 將舊版未正規化的詞向量就地正規化為float32單位向量，回傳遷移的文章數
+        # 只處理標記為舊版（version = LEGACY_VECTOR_VERSION）的列，正規化後改為目前的格式版本
+        cursor = self.conn.cursor()
+        migrated_count = 0
+        
+        while True:
+            cursor.execute('''
+                SELECT article_id, title_vector, content_vector
+                FROM article_vectors
+                WHERE title_vector IS NOT NULL AND content_vector IS NOT NULL
+                  AND version = ? AND COALESCE(normalized, 0) = 0
+                LIMIT ?
+            ''', (LEGACY_VECTOR_VERSION, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            updates = []
+            invalid_ids = []
+            for article_id, title_value, content_value in rows:
+                vectors = []
+                tags = []
+                for value in (title_value, content_value):
+                    try:
+                        vector = decode_vector(value)
+                        tags.append(read_vector_header(value)['model_tag'] if isinstance(value, bytes) else 0)
+                    except Exception as e:
+                        self.logger.error(f"詞向量格式錯誤，清除後重新計算: article_id={article_id}, 錯誤: {e}")
+                        vector = None
+                    if vector is not None and vector.size:
+                        norm = np.linalg.norm(vector)
+                        if norm > 0:
+                            vector = vector / norm
+                    vectors.append(vector)
+                
+                if any(vector is None for vector in vectors):
+                    invalid_ids.append((article_id,))
+                else:
+                    updates.append((
+                        encode_vector(vectors[0], True, tag=tags[0]),
+                        encode_vector(vectors[1], True, tag=tags[1]),
+                        article_id
+                    ))
+            
+            cursor.executemany('''
+                UPDATE article_vectors
+                SET title_vector = ?, content_vector = ?, normalized = 1, version = ?
+                WHERE article_id = ?
+            ''', [(title_value, content_value, VECTOR_FORMAT_VERSION, article_id)
+                  for title_value, content_value, article_id in updates])
+            cursor.executemany('DELETE FROM article_vectors WHERE article_id = ?', invalid_ids)
+            self.conn.commit()
+            migrated_count += len(rows)
+        
+        if migrated_count:
+            self.logger.info(f"已將 {migrated_count} 篇文章的舊版詞向量正規化")
+        return migrated_count
+    
+    def current_timestamp(self) -> str:
+        # 資料庫端的目前時間，與 updated_at 欄位同格式，供增量同步記錄同步時間點
+        return self.conn.execute('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+    
+    def iter_article_vectors(self, batch_size: int = 20000, model_name: Optional[str] = None,
+                             updated_since: Optional[str] = None) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+
+        # 依文章id分批串流詞向量，每批為 (文章id, 標題向量矩陣, 內容向量矩陣, 是否已正規化)
+        # 只讀取 article_vectors 資料表，不碰文章內文；model_name 指定時略過其他模型算出的向量（未記錄模型者視為相容）
+        # updated_since 指定時只取該時間點（含）之後寫入的詞向量，供常駐索引增量更新
+        cursor = self.conn.cursor()
+        filters = ""
+        filter_params = []
+        if model_name:
+            filters += " AND (model = '' OR model = ?)"
+            filter_params.append(model_name)
+        if updated_since:
+            filters += " AND updated_at >= ?"
+            filter_params.append(updated_since)
+        last_id = 0
+        dim = None
+        
+        while True:
+            cursor.execute(f'''
+                SELECT article_id, normalized, title_vector, content_vector
+                FROM article_vectors
+                WHERE article_id > ? AND title_vector IS NOT NULL AND content_vector IS NOT NULL{filters}
+                ORDER BY article_id
+                LIMIT ?
+            ''', [last_id] + filter_params + [batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            
+            ids, normalized, title_values, content_values = zip(*rows)
+            title_matrix = decode_vector_batch(list(title_values), dim)
+            dim = title_matrix.shape[1]
+            content_matrix = decode_vector_batch(list(content_values), dim)
+            yield (np.asarray(ids, dtype=np.int64), title_matrix, content_matrix,
+                   np.asarray(normalized, dtype=bool))
+    
+    def get_removed_vector_ids(self, removed_since: Optional[str] = None) -> List[int]:
+        # 該時間點（含）之後被刪除詞向量的文章id，供常駐索引移除
+        cursor = self.conn.cursor()
+        if removed_since:
+            cursor.execute('SELECT article_id FROM vector_tombstones WHERE removed_at >= ?', (removed_since,))
+        else:
+            cursor.execute('SELECT article_id FROM vector_tombstones')
+        return [row[0] for row in cursor.fetchall()]
+    
+    def prune_vector_tombstones(self, days: int = 7) -> int:
+        # 刪除紀錄只需保留到所有常駐索引都已同步，過期的紀錄定期清除
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM vector_tombstones WHERE removed_at < DATETIME("now", ?)', (f"-{int(days)} days",))
+        self.conn.commit()
+        return cursor.rowcount
+    
+    def get_article_vector_arrays(self, model_name: Optional[str] = None, batch_size: int = 20000,
+                                  updated_since: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+
+        # 將 iter_article_vectors 的各批串接為完整陣列，供檢索時一次建立矩陣
+        batches = list(self.iter_article_vectors(batch_size, model_name, updated_since))
+        if not batches:
+            empty = np.zeros((0, 0), dtype=np.float32)
+            return np.zeros(0, dtype=np.int64), empty, empty, np.zeros(0, dtype=bool)
+        
+        ids, title_matrices, content_matrices, normalized = zip(*batches)
+        return np.concatenate(ids), np.vstack(title_matrices), np.vstack(content_matrices), np.concatenate(normalized)
+    
+    def get_articles_by_ids(self, article_ids: Iterable[int], chunk_size: int = 500) -> List[Dict[str, Any]]:
+
+        # 以主鍵一次取回多篇文章（WHERE id IN，每 chunk_size 個id一次查詢），回傳順序與 article_ids 相同
+        # 用於檢索排序後取回前幾名的完整文章，不存在的id略過
+        unique_ids = list(dict.fromkeys(int(article_id) for article_id in article_ids))
+        articles = {}
+        
+        cursor = self.conn.cursor()
+        for start in range(0, len(unique_ids), chunk_size):
+            batch = unique_ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'''
+                SELECT id, title, author, date, content, url
+                FROM articles
+                WHERE id IN ({placeholders})
+            ''', batch)
+            for row in cursor.fetchall():
+                articles[row[0]] = {
+                    'id': row[0],
+                    'title': row[1],
+                    'author': row[2],
+                    'date': row[3],
+                    'content': row[4],
+                    'url': row[5]
+                }
+        
+        return [articles[article_id] for article_id in unique_ids if article_id in articles]
+    
+    def get_vector_matrix(self, limit: Optional[int] = None, include_chunks: bool = True,
+                          sample: Optional[int] = None) -> np.ndarray:
+
+        # 取出已儲存的標題、內容（及片段）詞向量堆成矩陣，供擬合PCA或評估降維效果
+        # sample 指定時在SQL中隨機抽取至多 sample 個向量，不需先將所有詞向量載入記憶體
+        queries = [
+            'SELECT title_vector FROM article_vectors WHERE title_vector IS NOT NULL',
+            'SELECT content_vector FROM article_vectors WHERE content_vector IS NOT NULL'
+        ]
+        if include_chunks:
+            queries.append('SELECT vector FROM article_chunks WHERE vector IS NOT NULL')
+        
+        if sample:
+            queries = [f"SELECT * FROM ({' UNION ALL '.join(queries)}) ORDER BY random() LIMIT {int(sample)}"]
+        elif limit:
+            queries = [query + f' LIMIT {int(limit)}' for query in queries]
+        
+        cursor = self.conn.cursor()
+        vectors = []
+        for query in queries:
+            for (value,) in cursor.execute(query):
+                vector = decode_vector(value)
+                if vector.size:
+                    vectors.append(vector)
+        
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+    
+    def transform_stored_vectors(self, transform: Callable[[np.ndarray], np.ndarray], batch_size: int = 1000,
+                                 meta: Optional[Dict[str, Any]] = None) -> int:
+
+        # 以 transform（矩陣 -> 矩陣）就地轉換所有已儲存的詞向量，例如套用PCA降維，回傳轉換的向量數
+        # 所有批次在同一個交易中寫入，中途失敗時全部回滾，不會留下部分已轉換的詞向量
+        # meta: 與轉換後的詞向量在同一個交易中寫入 db_meta 的設定（例如降維參數）
+        targets = [
+            ('article_vectors', 'article_id', 'title_vector'),
+            ('article_vectors', 'article_id', 'content_vector'),
+            ('article_chunks', 'id', 'vector')
+        ]
+        
+        cursor = self.conn.cursor()
+        transformed_count = 0
+        try:
+            for table, key, column in targets:
+                last_id = 0
+                while True:
+                    cursor.execute(f'''
+                        SELECT {key}, {column} FROM {table}
+                        WHERE {key} > ? AND {column} IS NOT NULL
+                        ORDER BY {key}
+                        LIMIT ?
+                    ''', (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    
+                    # 轉換後保留原本標頭中的模型資訊
+                    rows = [(row_id, value, decode_vector(value)) for row_id, value in rows]
+                    rows = [(row_id, value, vector) for row_id, value, vector in rows if vector.size]
+                    if not rows:
+                        continue
+                    
+                    matrix = transform(np.vstack([vector for _, _, vector in rows]))
+                    updates = []
+                    for (row_id, value, _), vector in zip(rows, matrix):
+                        header = read_vector_header(value) if isinstance(value, bytes) else {'normalized': False, 'model_tag': 0}
+                        updates.append((encode_vector(vector, header['normalized'], tag=header['model_tag']), row_id))
+                    cursor.executemany(f'UPDATE {table} SET {column} = ? WHERE {key} = ?', updates)
+                    transformed_count += len(rows)
+            if meta:
+                self.set_meta(meta, commit=False)
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        
+        self.logger.info(f"已轉換 {transformed_count} 個已儲存的詞向量")
+        return transformed_count
+    
+    def migrate_vectors_to_blob(self, batch_size: int = 1000) -> int:
+
+        # 一次性遷移：將舊版 JSON 文字詞向量轉為 float32 BLOB（文章詞向量此時仍在 articles 資料表）
+        article_columns = [row[1] for row in self.conn.execute('PRAGMA table_info(articles)').fetchall()]
+        targets = [
+            ('article_chunks', 'vector', 'vector_normalized')
+        ]
+        if 'title_vector' in article_columns:
+            normalized_column = 'vectors_normalized' if 'vectors_normalized' in article_columns else '0'
+            targets = [
+                ('articles', 'title_vector', normalized_column),
+                ('articles', 'content_vector', normalized_column)
+            ] + targets
+        
+        cursor = self.conn.cursor()
+        migrated_count = 0
+        for table, column, normalized_column in targets:
+            last_id = 0
+            while True:
+                cursor.execute(f'''
+                    SELECT id, {column}, COALESCE({normalized_column}, 0) FROM {table}
+                    WHERE id > ? AND typeof({column}) = 'text'
+                    ORDER BY id
+                    LIMIT ?
+                ''', (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                
+                updates = []
+                for row_id, value, normalized in rows:
+                    try:
+                        updates.append((encode_vector(json.loads(value), bool(normalized)), row_id))
+                    except Exception as e:
+                        # 無法解析的詞向量清除後重新計算
+                        self.logger.error(f"詞向量格式錯誤，清除後重新計算: {table}.id={row_id}, 錯誤: {e}")
+                        updates.append((None, row_id))
+                
+                cursor.executemany(f'UPDATE {table} SET {column} = ? WHERE id = ?', updates)
+                self.conn.commit()
+                migrated_count += len(updates)
+        
+        if migrated_count:
+            self.logger.info(f"已將 {migrated_count} 個JSON詞向量轉為float32 BLOB")
+        return migrated_count
+    
+    def migrate_vectors_to_table(self) -> int:
+
+        # 一次性遷移：將 articles 資料表中的詞向量欄位搬到 article_vectors，並移除舊欄位
+        article_columns = [row[1] for row in self.conn.execute('PRAGMA table_info(articles)').fetchall()]
+        legacy_columns = [column for column in ('title_vector', 'content_vector', 'vectors_normalized')
+                          if column in article_columns]
+        if 'title_vector' not in legacy_columns or 'content_vector' not in legacy_columns:
+            return 0
+        
+        normalized_column = 'vectors_normalized' if 'vectors_normalized' in legacy_columns else '0'
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO article_vectors
+                (article_id, model, version, normalized, title_vector, content_vector, updated_at)
+                SELECT id, '', CASE WHEN COALESCE({normalized_column}, 0) THEN {VECTOR_FORMAT_VERSION}
+                                    ELSE {LEGACY_VECTOR_VERSION} END,
+                       COALESCE({normalized_column}, 0),
+                       title_vector, content_vector, updated_at
+                FROM articles
+                WHERE title_vector IS NOT NULL AND content_vector IS NOT NULL
+            ''')
+            migrated_count = cursor.rowcount
+            
+            for column in legacy_columns:
+                try:
+                    cursor.execute(f'ALTER TABLE articles DROP COLUMN {column}')
+                except sqlite3.OperationalError:
+                    # SQLite 3.35 以前不支援 DROP COLUMN，清空欄位內容即可釋放空間
+                    cursor.execute(f'UPDATE articles SET {column} = NULL')
+            
+            self.conn.commit()
+            self.logger.info(f"已將 {migrated_count} 篇文章的詞向量移至 article_vectors 資料表")
+            return migrated_count
+        except Exception as e:
+            self.conn.rollback()
+            self.logger.error(f"遷移詞向量資料表失敗: {e}")
+            raise
+    
+    def get_articles_without_vectors(self, model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+
+        # model_name 指定時，由其他模型算出的詞向量也視為需要重新計算（未記錄模型者視為相容）
+        cursor = self.conn.cursor()
+        model_filter = "OR (v.model != '' AND v.model != ?)" if model_name else ""
+        cursor.execute(f'''
+            SELECT a.id, a.title, a.content 
+            FROM articles a
+            LEFT JOIN article_vectors v ON v.article_id = a.id
+            WHERE v.title_vector IS NULL OR v.content_vector IS NULL OR COALESCE(a.chunks_indexed, 0) = 0
+                  {model_filter}
+        ''', [model_name] if model_name else [])
         
         articles = []
         for row in cursor.fetchall():
@@ -124,25 +936,228 @@ class DatabaseManager:
         
         return articles
     
+    def get_chunk_vector_arrays(self, article_ids: Optional[Iterable[int]] = None,
+                                chunk_size: int = 500,
+                                model_name: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+
+        # 以陣列形式取回片段詞向量：(片段id, 所屬文章id, 詞向量矩陣, 是否已正規化)
+        # article_ids 指定時只取這些文章的片段，供常駐索引增量更新
+        # 片段與文章詞向量同時計算，以文章詞向量的模型篩選，與 iter_article_vectors 一致
+        query = '''
+            SELECT c.id, c.article_id, c.vector_normalized, c.vector
+            FROM article_chunks c
+            JOIN article_vectors v ON v.article_id = c.article_id
+            WHERE c.vector IS NOT NULL
+        '''
+        params = []
+        if model_name:
+            query += " AND (v.model = '' OR v.model = ?)"
+            params.append(model_name)
+        
+        cursor = self.conn.cursor()
+        if article_ids is None:
+            rows = cursor.execute(query + ' ORDER BY c.id', params).fetchall()
+        else:
+            unique_ids = list(dict.fromkeys(int(article_id) for article_id in article_ids))
+            rows = []
+            for start in range(0, len(unique_ids), chunk_size):
+                batch = unique_ids[start:start + chunk_size]
+                placeholders = ','.join('?' * len(batch))
+                rows.extend(cursor.execute(query + f' AND c.article_id IN ({placeholders})', params + batch).fetchall())
+        
+        if not rows:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                    np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=bool))
+        
+        chunk_ids, chunk_article_ids, normalized, values = zip(*rows)
+        return (np.asarray(chunk_ids, dtype=np.int64), np.asarray(chunk_article_ids, dtype=np.int64),
+                decode_vector_batch(list(values)), np.asarray(normalized, dtype=bool))
+    
+    def get_chunks_by_ids(self, chunk_ids: List[int], chunk_size: int = 500) -> Dict[int, Dict[str, Any]]:
+
+        # 取回片段文字（由文章內文依位置擷取）與所屬文章資訊，以片段id為鍵
+        chunks = {}
+        cursor = self.conn.cursor()
+        unique_ids = list(dict.fromkeys(chunk_ids))
+        for start in range(0, len(unique_ids), chunk_size):
+            batch = unique_ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'''
+                SELECT c.id, c.article_id, c.start_offset, c.end_offset,
+                       substr(a.content, c.start_offset + 1, c.end_offset - c.start_offset),
+                       a.title, a.author, a.date, a.url
+                FROM article_chunks c
+                JOIN articles a ON a.id = c.article_id
+                WHERE c.id IN ({placeholders})
+            ''', batch)
+            for row in cursor.fetchall():
+                chunks[row[0]] = {
+                    'id': row[0],
+                    'article_id': row[1],
+                    'start': row[2],
+                    'end': row[3],
+                    'text': row[4],
+                    'title': row[5],
+                    'author': row[6],
+                    'date': row[7],
+                    'url': row[8]
+                }
+        
+        return chunks
+    
     def get_all_articles(self) -> pd.DataFrame:
 
         query = '''
-            SELECT id, title, author, date, content, url, title_vector, content_vector, created_at
-            FROM articles
-            ORDER BY created_at DESC
+            SELECT a.id, a.title, a.author, a.date, a.content, a.url,
+                   v.title_vector, v.content_vector, COALESCE(v.normalized, 0) AS vectors_normalized, a.created_at
+            FROM articles a
+            LEFT JOIN article_vectors v ON v.article_id = a.id
+            ORDER BY a.created_at DESC
         '''
         return pd.read_sql_query(query, self.conn)
     
     def search_articles_by_keyword(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
 
+        # 以空白分隔的多個關鍵字需同時出現；優先使用全文索引並依BM25排序
+        # trigram 索引無法比對少於3個字的關鍵字，此時退回 LIKE
+        terms = keyword.split()
+        if self.fts_enabled and terms and all(len(term) >= 3 for term in terms):
+            try:
+                return self.search_articles_fts(terms, limit)
+            except sqlite3.OperationalError as e:
+                self.logger.warning(f"全文檢索失敗，改用LIKE: {e}")
+        
+        return self.search_articles_by_like(keyword, limit)
+    
+    def search_articles_fts(self, terms: List[str], limit: int = 10) -> List[Dict[str, Any]]:
+
+        # 每個關鍵字以雙引號包住作為片語比對，避免標點被解讀為FTS5語法；標題權重較內文高
+        match_query = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        
         cursor = self.conn.cursor()
         cursor.execute('''
+            SELECT a.id, a.title, a.author, a.date, a.content, a.url, bm25(articles_fts, 2.0, 1.0) AS score
+            FROM articles_fts
+            JOIN articles a ON a.id = articles_fts.rowid
+            WHERE articles_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ''', (match_query, limit))
+        
+        articles = []
+        for row in cursor.fetchall():
+            articles.append({
+                'id': row[0],
+                'title': row[1],
+                'author': row[2],
+                'date': row[3],
+                'content': row[4],
+                'url': row[5],
+                'score': -row[6]  # bm25() 越小越相關，轉為越大越相關
+            })
+        
+        return articles
+    
+    @staticmethod
+    def split_query_terms(text: str, max_terms: int = 32) -> Tuple[List[str], List[str]]:
+        # 以標點與空白切段，回傳 (全文索引可比對的詞, 兩個字的短詞)
+        # 英數詞整個比對，中文段落拆成重疊的三字詞（trigram）；trigram 索引無法比對兩個字的人名、數字，另外回傳
+        terms = []
+        short_terms = []
+        for segment in re.split(r'[\s\W_]+', text):
+            if len(segment) == 2:
+                candidates, target = [segment], short_terms
+            elif re.fullmatch(r'[A-Za-z0-9]+', segment):
+                candidates, target = ([segment] if len(segment) >= 3 else []), terms
+            else:
+                candidates, target = [segment[i:i + 3] for i in range(len(segment) - 2)], terms
+            for term in candidates:
+                if term not in target:
+                    target.append(term)
+        
+        return terms[:max_terms], short_terms[:max_terms]
+    
+    @staticmethod
+    def build_fts_query(text: str, max_terms: int = 32) -> str:
+        # 將自然語句轉為 FTS5 查詢，各詞以 OR 連接
+        # BM25 依各詞在語料中的稀有程度加權，人名、數字等少見詞自然排在前面
+        terms, _ = DatabaseManager.split_query_terms(text, max_terms)
+        return ' OR '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    
+    @staticmethod
+    def like_pattern(term: str) -> str:
+        # 子字串比對的 LIKE 樣式，% 與 _ 視為一般字元（搭配 ESCAPE '\'）
+        return '%{}%'.format(re.sub(r'([\\%_])', r'\\\1', term))
+    
+    def search_articles_bm25(self, text: str, limit: int = 50) -> List[Dict[str, Any]]:
+
+        # 以問題全文做 BM25 檢索，只回傳文章id與分數，完整文章由 get_articles_by_ids 取回
+        # 未啟用全文索引或問題中沒有可比對的詞時回傳空列表
+        match_query = self.build_fts_query(text)
+        if not self.fts_enabled or not match_query:
+            return []
+        
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT rowid, bm25(articles_fts, 2.0, 1.0) AS score
+                FROM articles_fts
+                WHERE articles_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            ''', (match_query, limit))
+            return [{'id': row[0], 'score': -row[1]} for row in cursor.fetchall()]
+        except sqlite3.OperationalError as e:
+            self.logger.error(f"BM25檢索失敗: {e}")
+            return []
+    
+    def search_articles_short_terms(self, text: str, limit: int = 50) -> List[Dict[str, Any]]:
+
+        # 以 LIKE 比對問題中兩個字的短詞（全文索引無法比對），回傳 [{'id', 'score'}]，score 為命中的短詞數（標題命中計2）
+        # 需掃描整個文章資料表，只在問題中有短詞時執行
+        _, short_terms = self.split_query_terms(text)
+        if not short_terms:
+            return []
+        
+        hits = []
+        params = []
+        for term in short_terms:
+            hits.append("(title LIKE ? ESCAPE '\\') * 2 + (content LIKE ? ESCAPE '\\')")
+            params.extend([self.like_pattern(term)] * 2)
+        
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+                SELECT id, score FROM (
+                    SELECT id, {' + '.join(hits)} AS score, created_at FROM articles
+                )
+                WHERE score > 0
+                ORDER BY score DESC, created_at DESC
+                LIMIT ?
+            ''', params + [limit])
+            return [{'id': row[0], 'score': float(row[1])} for row in cursor.fetchall()]
+        except sqlite3.OperationalError as e:
+            self.logger.error(f"短詞檢索失敗: {e}")
+            return []
+    
+    def search_articles_by_like(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+
+        # 與全文檢索相同，以空白分隔的每個關鍵字都需出現在標題或內文中；% 與 _ 視為一般字元
+        conditions = []
+        params = []
+        for term in keyword.split():
+            pattern = self.like_pattern(term)
+            conditions.append("(title LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\')")
+            params.extend([pattern, pattern])
+        
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
             SELECT id, title, author, date, content, url
             FROM articles
-            WHERE title LIKE ? OR content LIKE ?
+            WHERE {' AND '.join(conditions) or '1'}
             ORDER BY created_at DESC
             LIMIT ?
-        ''', (f'%{keyword}%', f'%{keyword}%', limit))
+        ''', params + [limit])
         
         articles = []
         for row in cursor.fetchall():
@@ -176,13 +1191,17 @@ class DatabaseManager:
         total_articles = cursor.fetchone()[0]
         
         # 有詞向量的文章數
-        cursor.execute('SELECT COUNT(*) FROM articles WHERE title_vector IS NOT NULL AND content_vector IS NOT NULL')
+        cursor.execute('SELECT COUNT(*) FROM article_vectors WHERE title_vector IS NOT NULL AND content_vector IS NOT NULL')
         articles_with_vectors = cursor.fetchone()[0]
         
         # 今日新增文章數
         cursor.execute('SELECT COUNT(*) FROM articles WHERE DATE(created_at) = DATE("now")')
         today_articles = cursor.fetchone()[0]
         
+        # 看板統計
+        cursor.execute('SELECT board, COUNT(*) FROM articles GROUP BY board ORDER BY COUNT(*) DESC')
+        board_counts = cursor.fetchall()
+        
         # 作者統計
         cursor.execute('SELECT author, COUNT(*) FROM articles GROUP BY author ORDER BY COUNT(*) DESC LIMIT 10')
         top_authors = cursor.fetchall()
@@ -191,6 +1210,7 @@ class DatabaseManager:
             'total_articles': total_articles,
             'articles_with_vectors': articles_with_vectors,
             'today_articles': today_articles,
+            'board_counts': board_counts,
             'top_authors': top_authors
         }
     
@@ -202,7 +1222,10 @@ class DatabaseManager:
         '''.format(days))
         
         deleted_count = cursor.rowcount
+        cursor.execute('DELETE FROM article_vectors WHERE article_id NOT IN (SELECT id FROM articles)')
+        cursor.execute('DELETE FROM article_chunks WHERE article_id NOT IN (SELECT id FROM articles)')
         self.conn.commit()
+        self.prune_vector_tombstones()
         self.logger.info(f"清理了 {deleted_count} 篇舊文章")
         return deleted_count
     
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import inspect
+import logging
+from typing import List, Optional
+import numpy as np
+
+# 可選的詞向量後端：
+#   torch: sentence-transformers 原生 PyTorch 模型
+#   onnx:  匯出為 ONNX 並做動態int8量化，以 onnxruntime 在CPU上推論（不需載入PyTorch）
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+# ONNX 後端在 numpy 中實作的池化方式
+ONNX_POOLING_MODES = ("mean", "cls", "max")
+
+def create_embedding_backend(backend: str, model_name: str, model_dir: str = "onnx_models",
+                             num_threads: Optional[int] = None):
+    # 依設定建立詞向量後端，兩者皆提供與 SentenceTransformer 相同的 encode 介面
+    # num_threads: 推論使用的執行緒數，多行程計算時每個行程只分配部分核心，避免互相搶佔
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return OnnxEmbeddingBackend(model_name, model_dir=model_dir, num_threads=num_threads)
+    raise ValueError(f"不支援的詞向量後端: {backend}，可用: {', '.join(EMBEDDING_BACKENDS)}")
+
+class OnnxEmbeddingBackend:
+    def __init__(self, model_name: str,
+                 model_dir: str = "onnx_models",
+                 num_threads: Optional[int] = None,
+                 quantize: bool = True):
+        
+        self.model_name = model_name #model_name: sentence-transformers 模型名稱或本機路徑
+        self.model_dir = os.path.join(model_dir, model_name.replace("/", "__")) #model_dir: 匯出後的ONNX模型與tokenizer存放目錄
+        self.num_threads = num_threads #num_threads: onnxruntime 運算執行緒數，None 表示由 onnxruntime 決定
+        self.quantize = quantize #quantize: 是否使用動態int8量化的模型
+        
+        self.session = None
+        self.tokenizer = None
+        self.config = {}
+        
+        self.setup_logging()
+        self.load()
+    
+    def setup_logging(self):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, "model_int8.onnx" if self.quantize else "model.onnx")
+    
+    @property
+    def config_path(self) -> str:
+        return os.path.join(self.model_dir, "embedding_config.json")
+    
+    def load(self):
+        # 推論只需 onnxruntime 與 tokenizers，不載入 PyTorch / transformers 以縮短啟動時間
+        import onnxruntime
+        from tokenizers import Tokenizer
+        
+        if not os.path.exists(self.model_path) or not os.path.exists(self.config_path):
+            self.export()
+        
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        
+        options = onnxruntime.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+        self.logger.info(f"ONNX詞向量模型載入完成: {self.model_path}")
+    
+    def export(self):
+        # 只在第一次使用時執行：以PyTorch載入原模型，匯出Transformer部分為ONNX，池化與正規化在numpy中完成
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        
+        start_time = time.time()
+        self.logger.info(f"正在匯出ONNX詞向量模型: {self.model_name} -> {self.model_dir}")
+        os.makedirs(self.model_dir, exist_ok=True)
+        
+        model = SentenceTransformer(self.model_name, device="cpu")
+        transformer = model[0]
+        if not transformer.tokenizer.is_fast:
+            raise ValueError(f"ONNX後端需要支援 tokenizer.json 的 fast tokenizer: {self.model_name}")
+        pooling_config = model[1].get_config_dict() if len(model) > 1 else {}
+        
+        # 新舊版 sentence-transformers 的池化設定格式不同；舊版以多個旗標表示，同時啟用多種時為串接，不支援
+        pooling_mode = pooling_config.get("pooling_mode")
+        if pooling_mode is None:
+            flag_modes = {"pooling_mode_cls_token": "cls", "pooling_mode_mean_tokens": "mean", "pooling_mode_max_tokens": "max"}
+            enabled = [name for name, value in pooling_config.items() if name.startswith("pooling_mode_") and value]
+            pooling_mode = "+".join(flag_modes.get(name, name) for name in enabled) or "mean"
+        if pooling_mode not in ONNX_POOLING_MODES:
+            raise ValueError(f"ONNX後端不支援的池化方式: {pooling_mode}，可用: {', '.join(ONNX_POOLING_MODES)}")
+        
+        config = {
+            "model_name": self.model_name,
+            "pooling_mode": pooling_mode,
+            "normalize": any(type(module).__name__ == "Normalize" for module in model),
+            "max_seq_length": model.max_seq_length,
+            "pad_token": transformer.tokenizer.pad_token,
+            "pad_token_id": transformer.tokenizer.pad_token_id
+        }
+        
+        transformer.tokenizer.save_pretrained(self.model_dir)
+        sample = transformer.tokenizer(["匯出用的範例句子", "sample"], padding=True, return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        
+        class TransformerOutput(torch.nn.Module):
+            def __init__(self, auto_model):
+                super().__init__()
+                self.auto_model = auto_model
+            
+            def forward(self, *inputs):
+                return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+        
+        float_path = os.path.join(self.model_dir, "model.onnx")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        
+        # 較新版的 PyTorch 預設改用 dynamo 匯出器，這裡固定使用 TorchScript 匯出器
+        export_options = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_options["dynamo"] = False
+        
+        with torch.no_grad():
+            torch.onnx.export(
+                TransformerOutput(transformer.auto_model.eval()),
+                tuple(sample[name] for name in input_names),
+                float_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                **export_options
+            )
+        
+        if self.quantize:
+            quantize_dynamic(float_path, self.model_path, weight_type=QuantType.QInt8)
+        
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        
+        self.logger.info(f"ONNX詞向量模型匯出完成，耗時 {time.time() - start_time:.1f} 秒")
+    
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        # 與 SentenceTransformer.encode 相容的介面，回傳 float32 numpy 陣列
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size, convert_to_numpy, normalize_embeddings)[0]
+        
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch(batch)
+            encoded = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+            }
+            feed = {name: encoded[name] for name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+            embeddings.append(self.pool(token_embeddings, encoded["attention_mask"]))
+        
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        embeddings = np.vstack(embeddings).astype(np.float32)
+        if self.config.get("normalize") or normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings /= norms
+        return embeddings
+    
+    def pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        pooling_mode = self.config["pooling_mode"]
+        if pooling_mode == "cls":
+            return token_embeddings[:, 0]
+        
+        mask = attention_mask[..., np.newaxis].astype(np.float32)
+        if pooling_mode == "max":
+            # 與 sentence-transformers 相同，padding 位置以極小值排除
+            return np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        if pooling_mode == "mean":
+            return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        raise ValueError(f"ONNX後端不支援的池化方式: {pooling_mode}，可用: {', '.join(ONNX_POOLING_MODES)}")
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1])
@@ -0,0 +1,142 @@
+import sqlite3
+import hashlib
+import logging
+import unicodedata
+import re
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+class EmbeddingCache:
+    def __init__(self, db_path: str = "embedding_cache.db", model_name: str = "", lru_size: int = 100000,
+                 read_only: bool = False):
+        
+        self.db_path = db_path #db_path: 快取資料庫路徑
+        self.model_name = model_name #model_name: 詞向量模型名稱，納入快取鍵避免不同模型混用
+        self.lru_size = lru_size #lru_size: 行程內LRU快取的項目上限
+        self.read_only = read_only #read_only: 只讀取快取檔，新的詞向量暫存於 pending_rows 交由單一寫入者（父行程）寫入
+        
+        self.conn = None
+        self.pending_rows = []
+        self._lru = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        self.setup_logging()
+        self.init_database()
+    
+    def setup_logging(self):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger(__name__)
+    
+    def init_database(self):
+        try:
+            self.conn = sqlite3.connect(self.db_path, timeout=30)
+            self.conn.execute('PRAGMA busy_timeout = 30000')
+            if self.read_only:
+                self.conn.execute('PRAGMA query_only = ON')
+                return
+            
+            # WAL 模式下寫入者不會阻擋其他行程讀取快取
+            self.conn.execute('PRAGMA journal_mode = WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            ''')
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"詞向量快取初始化失敗: {e}")
+            raise
+    
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        # 全形半形統一並合併空白，僅空白差異的文字共用同一筆快取
+        text = unicodedata.normalize('NFKC', text)
+        return re.sub(r'\s+', ' ', text).strip()
+    
+    def make_key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{self.normalize_text(text)}".encode('utf-8')).hexdigest()
+    
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+    
+    def get_many(self, texts: List[str], chunk_size: int = 500) -> List[Optional[np.ndarray]]:
+        # 先查行程內LRU，再批次查詢SQLite；找不到的位置回傳None
+        keys = [self.make_key(text) for text in texts]
+        results = [None] * len(texts)
+        disk_lookup = {}
+        
+        for i, key in enumerate(keys):
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                results[i] = vector
+                self.memory_hits += 1
+            else:
+                disk_lookup.setdefault(key, []).append(i)
+        
+        pending_keys = list(disk_lookup)
+        for start in range(0, len(pending_keys), chunk_size):
+            chunk = pending_keys[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+            ).fetchall()
+            for key, dim, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                self._remember(key, vector)
+                for i in disk_lookup.pop(key):
+                    results[i] = vector
+                    self.disk_hits += 1
+        
+        self.misses += sum(len(positions) for positions in disk_lookup.values())
+        return results
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            key = self.make_key(text)
+            self._remember(key, vector)
+            rows.append((key, vector.shape[0], vector.tobytes()))
+        
+        if self.read_only:
+            self.pending_rows.extend(rows)
+            return
+        self.put_rows(rows)
+    
+    def take_pending_rows(self) -> List[Tuple[str, int, bytes]]:
+        # 取出唯讀模式下尚未寫入的 (快取鍵, 維度, 詞向量) 並清空，交由寫入者以 put_rows 寫入
+        rows, self.pending_rows = self.pending_rows, []
+        return rows
+    
+    def put_rows(self, rows: List[Tuple[str, int, bytes]]):
+        if not rows:
+            return
+        try:
+            self.conn.executemany('INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)', rows)
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"寫入詞向量快取失敗: {e}")
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'lru_items': len(self._lru)
+        }
+    
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
@@ -4,19 +4,55 @@ import sys
 import logging
 from datetime import datetime
 import argparse
-from typing import Optional
+from typing import Optional, Dict, Any
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from ptt_crawler import PTTCrawler
+from page_cache import PageCache
+from multi_board_crawler import crawl_board_to_database, crawl_boards
 from database_manager import DatabaseManager
 from vector_processor import VectorProcessor
-from rag_system import RAGSystem
+from parallel_embedding import iter_vectors_parallel
+from embedding_backend import EMBEDDING_BACKENDS
+from vector_index import INDEX_TYPES
+from vector_reducer import PCAReducer
+from rag_system import RAGSystem, RETRIEVAL_MODES
 from scheduler import PTTScheduler
 
 class PTTRAGMain:
-    def __init__(self, db_path: str = r"C:\Users\BIN\Desktop\政大畢業\PTT_RAG_System_Output\ptt_articles.db"):
+    def __init__(self, db_path: str = r"C:\Users\BIN\Desktop\政大畢業\PTT_RAG_System_Output\ptt_articles.db",
+                 crawl_threads: int = 8,
+                 requests_per_second: float = 5.0,
+                 cache_dir: Optional[str] = None,
+                 offline: bool = False,
+                 write_batch_size: int = 100,
+                 board: str = "Gossiping",
+                 embedding_cache_path: Optional[str] = None,
+                 embedding_backend: str = "torch",
+                 pca_path: Optional[str] = None,
+                 index_type: str = "flat",
+                 index_options: Optional[Dict[str, Any]] = None,
+                 retrieval_mode: str = "vector",
+                 keyword_weight: float = 1.0,
+                 vector_weight: float = 1.0,
+                 vector_model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
         self.db_path = db_path
+        self.crawl_threads = crawl_threads #crawl_threads: 爬蟲同時進行的請求數
+        self.requests_per_second = requests_per_second #requests_per_second: 爬蟲每秒請求上限
+        self.cache_dir = cache_dir #cache_dir: 原始HTML快取目錄，None 表示不快取
+        self.offline = offline #offline: 只從快取重播，不連線PTT
+        self.write_batch_size = write_batch_size #write_batch_size: 爬取時每批寫入資料庫的文章數
+        self.board = board #board: 要爬取的看板
+        self.embedding_cache_path = embedding_cache_path #embedding_cache_path: 句子詞向量快取檔案，None 表示不快取
+        self.embedding_backend = embedding_backend #embedding_backend: 詞向量後端，torch 或 onnx（int8量化，僅CPU）
+        self.pca_path = pca_path #pca_path: PCA降維參數檔，None 表示不降維
+        self.index_type = index_type #index_type: 檢索用的向量索引類型，flat、hnsw 或 ivfpq
+        self.index_options = index_options #index_options: 向量索引參數，如 ef_search、nprobe、pq_m
+        self.retrieval_mode = retrieval_mode #retrieval_mode: 檢索模式，vector 或 hybrid（BM25＋詞向量）
+        self.keyword_weight = keyword_weight #keyword_weight: 混合檢索時BM25排序的融合權重
+        self.vector_weight = vector_weight #vector_weight: 混合檢索時詞向量排序的融合權重
+        self.vector_model_name = vector_model_name #vector_model_name: 詞向量模型名稱
         self.setup_logging()
         
         # 組件將在需要時初始化
@@ -45,7 +81,12 @@ class PTTRAGMain:
     
     def init_crawler(self):
         if self.crawler is None:
-            self.crawler = PTTCrawler()
+            page_cache = PageCache(self.cache_dir) if self.cache_dir else None
+            self.crawler = PTTCrawler(board=self.board,
+                                      max_workers=self.crawl_threads,
+                                      requests_per_second=self.requests_per_second,
+                                      page_cache=page_cache,
+                                      offline=self.offline)
             self.logger.info("PTT爬蟲初始化完成")
         return self.crawler
     
@@ -57,37 +98,52 @@ class PTTRAGMain:
     
     def init_vector_processor(self):
         if self.vector_processor is None:
-            self.vector_processor = VectorProcessor()
+            self.vector_processor = VectorProcessor(self.vector_model_name,
+                                                   cache_path=self.embedding_cache_path,
+                                                   backend=self.embedding_backend,
+                                                   reducer_path=self.pca_path)
             self.logger.info("詞向量處理器初始化完成")
         return self.vector_processor
     
     def init_rag_system(self):
         if self.rag_system is None:
-            self.rag_system = RAGSystem(db_path=self.db_path)
+            self.rag_system = RAGSystem(db_path=self.db_path, vector_model_name=self.vector_model_name,
+                                        embedding_backend=self.embedding_backend,
+                                        pca_path=self.pca_path,
+                                        index_type=self.index_type,
+                                        index_options=self.index_options,
+                                        retrieval_mode=self.retrieval_mode,
+                                        keyword_weight=self.keyword_weight,
+                                        vector_weight=self.vector_weight)
             self.logger.info("RAG系統初始化完成")
         return self.rag_system
     
     def init_scheduler(self):
         if self.scheduler is None:
-            self.scheduler = PTTScheduler(db_path=self.db_path)
+            self.scheduler = PTTScheduler(db_path=self.db_path, vector_model_name=self.vector_model_name,
+                                          embedding_backend=self.embedding_backend,
+                                          pca_path=self.pca_path)
             self.logger.info("排程器初始化完成")
         return self.scheduler
     
-    def crawl_articles(self, pages: int = 30):
+    def crawl_articles(self, pages: int = 30, incremental: bool = True, resume: bool = False):
+        # resume: 長時間回補模式，從資料庫中的檢查點繼續，且不因整頁已儲存而停止
         try:
-            self.logger.info(f"開始爬取PTT八卦版前{pages}頁文章")
+            self.logger.info(f"開始爬取PTT {self.board} 版前{pages}頁文章")
             
             crawler = self.init_crawler()
-            articles = crawler.crawl_daily_articles(pages=pages)
-            
-            if not articles:
-                self.logger.warning("未爬取到任何文章")
-                return 0
-            
-            self.logger.info(f"成功爬取 {len(articles)} 篇文章")
+            db_manager = self.init_database()
             
-            # 自動儲存到資料庫
-            inserted_count = self.save_to_database(articles)
+            # 邊爬邊分批寫入資料庫，新文章在爬取途中即可被搜尋；離線重播需重新解析所有頁面並覆寫
+            inserted_count = crawl_board_to_database(
+                crawler,
+                db_manager,
+                pages=pages,
+                incremental=incremental and not self.offline,
+                resume=resume,
+                batch_size=self.write_batch_size,
+                replace=self.offline
+            )
             self.logger.info(f"成功儲存 {inserted_count} 篇新文章到資料庫")
             
             return inserted_count
@@ -96,12 +152,37 @@ class PTTRAGMain:
             self.logger.error(f"爬取文章失敗: {e}")
             return 0
     
+    def crawl_multiple_boards(self, boards, pages: int = 30, workers: int = 4,
+                              incremental: bool = True, resume: bool = False):
+        # 以多個行程平行爬取多個看板，共用 requests_per_second 的全域速率預算
+        try:
+            results = crawl_boards(
+                boards,
+                self.db_path,
+                pages=pages,
+                workers=workers,
+                requests_per_second=self.requests_per_second,
+                crawler_options={'max_workers': self.crawl_threads, 'offline': self.offline},
+                cache_dir=self.cache_dir,
+                incremental=incremental,
+                resume=resume,
+                batch_size=self.write_batch_size
+            )
+            
+            inserted_count = sum(results.values())
+            self.logger.info(f"多看板爬取完成，共新增 {inserted_count} 篇文章: {results}")
+            return inserted_count
+            
+        except Exception as e:
+            self.logger.error(f"多看板爬取失敗: {e}")
+            return 0
+    
     def save_to_database(self, articles):
         try:
             self.logger.info("開始儲存文章到資料庫")
             
             db_manager = self.init_database()
-            inserted_count = db_manager.insert_articles(articles)
+            inserted_count = db_manager.insert_articles(articles, replace=self.offline)
             
             self.logger.info(f"成功儲存 {inserted_count} 篇新文章到資料庫")
             return inserted_count
@@ -110,14 +191,25 @@ class PTTRAGMain:
             self.logger.error(f"儲存到資料庫失敗: {e}")
             return 0
     
-    def compute_vectors(self):
+    def compute_vectors(self, workers: int = 1, reembed: bool = False):
+        # workers: 大於1時以多個行程平行計算，各行程載入一次模型，結果由主行程單一寫入
+        # reembed: 更換詞向量模型時清除既有詞向量，全部重新計算
         try:
             self.logger.info("開始計算詞向量")
             
             db_manager = self.init_database()
-            vector_processor = self.init_vector_processor()
             
-            articles_without_vectors = db_manager.get_articles_without_vectors()
+            if reembed:
+                db_manager.clear_vectors()
+            else:
+                # 舊版未正規化的詞向量先遷移，檢索時才能一律以內積計算
+                db_manager.normalize_legacy_vectors()
+            
+            # 新詞向量須與已儲存的詞向量以同一組PCA參數降維（或同樣不降維）
+            reducer = PCAReducer(self.pca_path) if self.pca_path else None
+            db_manager.check_vector_reduction(reducer if reducer and reducer.is_fitted else None)
+            
+            articles_without_vectors = db_manager.get_articles_without_vectors(self.vector_model_name)
             
             if not articles_without_vectors:
                 self.logger.info("所有文章都已計算詞向量")
@@ -125,40 +217,85 @@ class PTTRAGMain:
             
             self.logger.info(f"需要計算詞向量的文章數: {len(articles_without_vectors)}")
             
-            # 批次計算詞向量
-            vector_results = vector_processor.batch_compute_vectors(articles_without_vectors)
-            
-            # 更新資料庫中的詞向量
-            for result in vector_results:
-                db_manager.update_vectors(
-                    result['id'],
-                    result['title_vector'],
-                    result['content_vector']
+            if workers > 1:
+                processor_options = {
+                    'model_name': self.vector_model_name,
+                    'cache_path': self.embedding_cache_path,
+                    'backend': self.embedding_backend,
+                    'reducer_path': self.pca_path,
+                    'normalize_embeddings': True
+                }
+                updated_count = 0
+                for vector_results in iter_vectors_parallel(articles_without_vectors, workers, processor_options):
+                    updated_count += db_manager.update_vectors_batch(vector_results, normalized=True,
+                                                                     model_name=self.vector_model_name)
+            else:
+                # 批次計算詞向量
+                vector_processor = self.init_vector_processor()
+                vector_results = vector_processor.batch_compute_vectors(articles_without_vectors)
+                
+                # 更新資料庫中的詞向量
+                updated_count = db_manager.update_vectors_batch(
+                    vector_results,
+                    normalized=vector_processor.normalize_embeddings,
+                    model_name=vector_processor.model_name
                 )
+                if self.embedding_cache_path:
+                    self.logger.info(f"詞向量快取統計: {vector_processor.get_cache_statistics()}")
             
-            self.logger.info(f"成功計算並更新 {len(vector_results)} 篇文章的詞向量")
-            return len(vector_results)
+            self.logger.info(f"成功計算並更新 {updated_count} 篇文章的詞向量")
+            return updated_count
             
         except Exception as e:
             self.logger.error(f"計算詞向量失敗: {e}")
             return 0
     
-    def full_pipeline(self, pages: int = 30):
+    def reduce_dimensions(self, n_components: int = 128, max_samples: int = 200000):
+        # 以資料庫中的全維度詞向量擬合PCA並儲存參數，再將已儲存的詞向量就地降維
+        # 之後計算詞向量與查詢時皆以同一組參數降維
+        try:
+            if not self.pca_path:
+                self.logger.error("需要指定PCA參數檔路徑")
+                return 0
+            
+            reducer = PCAReducer(self.pca_path)
+            if reducer.is_fitted:
+                self.logger.error(f"PCA參數檔已存在，資料庫中的詞向量已降維為 {reducer.output_dim} 維；"
+                                  f"如需重新擬合請刪除參數檔並以 --reembed 重新計算詞向量")
+                return 0
+            
+            db_manager = self.init_database()
+            stored_path = db_manager.get_meta('pca_path')
+            if stored_path:
+                self.logger.error(f"資料庫中的詞向量已以 {stored_path} 降維為 {db_manager.get_meta('pca_dim')} 維，"
+                                  f"如需重新擬合請以 --reembed 重新計算詞向量")
+                return 0
+            
+            vectors = db_manager.get_vector_matrix(sample=max_samples)
+            if len(vectors) == 0:
+                self.logger.error("資料庫中沒有詞向量，請先計算詞向量")
+                return 0
+            
+            reducer.fit(vectors, n_components, max_samples=max_samples)
+            
+            # 詞向量全部轉換並提交後才寫入參數檔；轉換失敗時資料庫回滾，參數檔不存在，可直接重試
+            transformed_count = db_manager.transform_stored_vectors(reducer.transform,
+                                                                    meta=db_manager.vector_reduction_meta(reducer))
+            reducer.save()
+            return transformed_count
+            
+        except Exception as e:
+            self.logger.error(f"詞向量降維失敗: {e}")
+            return 0
+    
+    def full_pipeline(self, pages: int = 30, incremental: bool = True):
         #執行完整流程：爬取 -> 儲存 -> 計算詞向量
         try:
             self.logger.info("開始執行完整流程")
             start_time = datetime.now()
             
-            # 1. 爬取文章
-            crawler = self.init_crawler()
-            articles = crawler.crawl_daily_articles(pages=pages)
-            
-            if not articles:
-                self.logger.warning("未爬取到任何文章")
-                return
-            
-            # 2. 儲存到資料庫
-            inserted_count = self.save_to_database(articles)
+            # 1. 爬取文章 2. 儲存到資料庫（邊爬邊寫入）
+            inserted_count = self.crawl_articles(pages, incremental=incremental)
             
             # 3. 計算詞向量
             vector_count = self.compute_vectors()
@@ -167,7 +304,6 @@ class PTTRAGMain:
             duration = end_time - start_time
             
             self.logger.info(f"完整流程執行完成")
-            self.logger.info(f"爬取文章數: {len(articles)}")
             self.logger.info(f"新增到資料庫: {inserted_count}")
             self.logger.info(f"計算詞向量: {vector_count}")
             self.logger.info(f"總耗時: {duration}")
@@ -205,6 +341,11 @@ class PTTRAGMain:
             print(f"今日新增文章數: {stats['today_articles']}")
             print(f"詞向量完成率: {stats['articles_with_vectors']/stats['total_articles']*100:.1f}%" if stats['total_articles'] > 0 else "0%")
             
+            if len(stats['board_counts']) > 1:
+                print("\n各看板文章數:")
+                for board, count in stats['board_counts']:
+                    print(f"  {board}: {count} 篇")
+            
             if stats['top_authors']:
                 print("\n熱門作者 (前5名):")
                 for i, (author, count) in enumerate(stats['top_authors'][:5], 1):
@@ -225,7 +366,8 @@ class PTTRAGMain:
             
             for i, article in enumerate(articles, 1):
                 print(f"{i}. {article['title']}")
-                print(f"   作者: {article['author']} | 時間: {article['date']}")
+                print(f"   作者: {article['author']} | 時間: {article['date']}"
+                      + (f" | 相關度: {article['score']:.2f}" if 'score' in article else ""))
                 print(f"   內容: {article['content'][:100]}...")
                 print()
             
@@ -243,25 +385,82 @@ class PTTRAGMain:
 
 def main():
     parser = argparse.ArgumentParser(description="PTT八卦版RAG系統")
-    parser.add_argument("--action", choices=["crawl", "vectors", "chat", "scheduler", "stats", "search", "full"], 
+    parser.add_argument("--action", choices=["crawl", "vectors", "pca", "chat", "scheduler", "stats", "search", "full"], 
                        help="執行動作")
     parser.add_argument("--pages", type=int, default=30, help="爬取頁數")
     parser.add_argument("--keyword", type=str, help="搜尋關鍵字")
     parser.add_argument("--limit", type=int, default=10, help="搜尋結果數量限制")
+    parser.add_argument("--threads", type=int, default=8, help="爬蟲同時進行的請求數")
+    parser.add_argument("--rps", type=float, default=5.0, help="爬蟲每秒請求上限")
+    parser.add_argument("--no-incremental", action="store_true", help="重新爬取所有頁面，不略過已儲存的文章")
+    parser.add_argument("--board", type=str, default="Gossiping", help="要爬取的看板")
+    parser.add_argument("--boards", type=str, help="以逗號分隔的多個看板，平行爬取")
+    parser.add_argument("--workers", type=int, default=4, help="多看板爬取的行程數")
+    parser.add_argument("--embedding-cache", type=str, help="句子詞向量快取檔案 (SQLite)")
+    parser.add_argument("--embed-workers", type=int, default=1, help="計算詞向量的行程數，大於1時平行計算")
+    parser.add_argument("--reembed", action="store_true", help="清除既有詞向量並全部重新計算（更換模型時使用）")
+    parser.add_argument("--pca-path", type=str, help="PCA降維參數檔 (.npz)，寫入與查詢時皆套用")
+    parser.add_argument("--pca-dim", type=int, default=128, help="--action pca 時降維後的維度")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default="torch",
+                       help="詞向量後端：torch 或 onnx（int8量化，僅CPU，首次使用時自動匯出）")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="檢索用的向量索引：flat（精確）、hnsw 或 ivfpq（大量文章時使用）")
+    parser.add_argument("--ef-search", type=int, help="HNSW查詢時的候選數")
+    parser.add_argument("--nprobe", type=int, help="IVF-PQ查詢時搜尋的分群數")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ每個向量的編碼位元組數，需整除詞向量維度")
+    parser.add_argument("--retrieval-mode", choices=RETRIEVAL_MODES, default="vector",
+                        help="檢索模式：vector 或 hybrid（BM25關鍵字與詞向量同時檢索，以RRF合併）")
+    parser.add_argument("--keyword-weight", type=float, default=1.0, help="混合檢索時BM25排序的融合權重")
+    parser.add_argument("--vector-weight", type=float, default=1.0, help="混合檢索時詞向量排序的融合權重")
+    parser.add_argument("--resume", action="store_true", help="從上次中斷的檢查點繼續長時間回補爬取")
+    parser.add_argument("--cache-dir", type=str, help="原始HTML快取目錄")
+    parser.add_argument("--offline", action="store_true", help="從快取重播爬取結果並重新解析，不連線PTT（需搭配 --cache-dir）")
     
     args = parser.parse_args()
     
     # 建立主系統
-    main_system = PTTRAGMain()
+    if args.offline and not args.cache_dir:
+        print("離線重播需要提供快取目錄: --cache-dir")
+        return
+    
+    main_system = PTTRAGMain(crawl_threads=args.threads,
+                             requests_per_second=args.rps,
+                             cache_dir=args.cache_dir,
+                             offline=args.offline,
+                             board=args.board,
+                             embedding_cache_path=args.embedding_cache,
+                             embedding_backend=args.embedding_backend,
+                             pca_path=args.pca_path,
+                             index_type=args.index_type,
+                             retrieval_mode=args.retrieval_mode,
+                             keyword_weight=args.keyword_weight,
+                             vector_weight=args.vector_weight,
+                             index_options={
+                                 name: value for name, value in
+                                 (('ef_search', args.ef_search), ('nprobe', args.nprobe), ('pq_m', args.pq_m))
+                                 if value is not None
+                             })
     
     try:
         if args.action == "crawl":
             # 只爬取文章
-            main_system.crawl_articles(args.pages)
+            if args.boards:
+                boards = [board.strip() for board in args.boards.split(",") if board.strip()]
+                main_system.crawl_multiple_boards(boards, args.pages, workers=args.workers,
+                                                  incremental=not args.no_incremental, resume=args.resume)
+            else:
+                main_system.crawl_articles(args.pages, incremental=not args.no_incremental, resume=args.resume)
             
         elif args.action == "vectors":
             # 只計算詞向量
-            main_system.compute_vectors()
+            main_system.compute_vectors(workers=args.embed_workers, reembed=args.reembed)
+            
+        elif args.action == "pca":
+            # 擬合PCA並將已儲存的詞向量降維
+            if not args.pca_path:
+                print("請提供PCA參數檔路徑: --pca-path")
+                return
+            main_system.reduce_dimensions(args.pca_dim)
             
         elif args.action == "chat":
             # 啟動聊天介面
@@ -284,7 +483,7 @@ def main():
             
         elif args.action == "full":
             # 執行完整流程
-            main_system.full_pipeline(args.pages)
+            main_system.full_pipeline(args.pages, incremental=not args.no_incremental)
             
         else:
             # 互動式選單
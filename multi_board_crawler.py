@@ -0,0 +1,114 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+from ptt_crawler import PTTCrawler, RateLimiter
+from page_cache import PageCache
+from database_manager import DatabaseManager
+
+def crawl_board_to_database(crawler: PTTCrawler,
+                            db_manager: DatabaseManager,
+                            pages: int = 30,
+                            incremental: bool = True,
+                            resume: bool = False,
+                            batch_size: int = 100,
+                            replace: bool = False) -> int:
+    # 爬取單一看板並邊爬邊分批寫入資料庫，回傳新增文章數
+    # resume: 長時間回補模式，從資料庫中的檢查點繼續，且不因整頁已儲存而停止
+    logger = logging.getLogger(__name__)
+    checkpoint_name = crawler.board
+    
+    checkpoint = None
+    if resume:
+        checkpoint = db_manager.load_crawl_checkpoint(checkpoint_name)
+        if checkpoint:
+            logger.info(f"找到 {checkpoint_name} 版檢查點 (更新於 {checkpoint['updated_at']})，已完成 {checkpoint['pages_done']} 頁")
+        else:
+            logger.info(f"找不到 {checkpoint_name} 版檢查點，從最新頁開始")
+    
+    articles = crawler.iter_daily_articles(
+        pages=pages,
+        known_urls_lookup=db_manager.get_existing_urls if incremental or resume else None,
+        checkpoint=checkpoint,
+        stop_at_known_page=not resume
+    )
+    
+    # 回補模式下每批寫入後更新檢查點
+    save_checkpoint = None
+    if resume:
+        save_checkpoint = lambda: db_manager.save_crawl_checkpoint(checkpoint_name, crawler.crawl_state)
+    
+    inserted_count = db_manager.insert_articles_stream(
+        articles,
+        batch_size=batch_size,
+        replace=replace,
+        on_commit=save_checkpoint
+    )
+    
+    if resume:
+        db_manager.clear_crawl_checkpoint(checkpoint_name)
+    
+    return inserted_count
+
+# 子行程共用的令牌桶狀態，由 initializer 設定
+_shared_rate_limit_state = None
+
+def _init_worker(rate_limit_state):
+    global _shared_rate_limit_state
+    _shared_rate_limit_state = rate_limit_state
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - %(levelname)s - [pid {os.getpid()}] %(message)s')
+
+def _crawl_board_worker(board: str, db_path: str, pages: int, crawler_options: Dict[str, Any],
+                        cache_dir: Optional[str], incremental: bool, resume: bool, batch_size: int) -> int:
+    # 快取物件含有鎖無法跨行程傳遞，各行程自行開啟同一個快取目錄
+    page_cache = PageCache(cache_dir) if cache_dir else None
+    crawler = PTTCrawler(board=board, rate_limit_state=_shared_rate_limit_state, page_cache=page_cache, **crawler_options)
+    with DatabaseManager(db_path) as db_manager:
+        return crawl_board_to_database(
+            crawler,
+            db_manager,
+            pages=pages,
+            incremental=incremental and not crawler.offline,
+            resume=resume,
+            batch_size=batch_size,
+            replace=crawler.offline
+        )
+
+def crawl_boards(boards: List[str],
+                 db_path: str,
+                 pages: int = 30,
+                 workers: int = 4,
+                 requests_per_second: float = 5.0,
+                 crawler_options: Optional[Dict[str, Any]] = None,
+                 cache_dir: Optional[str] = None,
+                 incremental: bool = True,
+                 resume: bool = False,
+                 batch_size: int = 100) -> Dict[str, int]:
+    # 以行程池平行爬取多個看板，所有行程共用 requests_per_second 的全域速率預算
+    logger = logging.getLogger(__name__)
+    crawler_options = dict(crawler_options or {})
+    crawler_options['requests_per_second'] = requests_per_second
+    
+    rate_limit_state = RateLimiter.create_shared_state(requests_per_second)
+    workers = max(1, min(workers, len(boards)))
+    logger.info(f"開始多看板爬取: {', '.join(boards)} (行程數: {workers}, 全域每秒請求上限: {requests_per_second})")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rate_limit_state,)) as executor:
+        futures = {
+            executor.submit(_crawl_board_worker, board, db_path, pages, crawler_options,
+                            cache_dir, incremental, resume, batch_size): board
+            for board in boards
+        }
+        
+        for future in as_completed(futures):
+            board = futures[future]
+            try:
+                results[board] = future.result()
+                logger.info(f"{board} 版爬取完成，新增 {results[board]} 篇文章")
+            except Exception as e:
+                logger.error(f"{board} 版爬取失敗: {e}")
+                results[board] = 0
+    
+    return results
@@ -0,0 +1,137 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+class PageCache:
+    def __init__(self,
+                 cache_dir: str = "page_cache",
+                 ttl: float = 7 * 24 * 3600,
+                 max_size_bytes: int = 2 * 1024 ** 3):
+        
+        self.cache_dir = cache_dir #cache_dir: 快取目錄
+        self.ttl = ttl #ttl: 快取有效秒數，過期後改以條件式請求重新驗證
+        self.max_size_bytes = max_size_bytes #max_size_bytes: 快取總大小上限，超過時淘汰最舊的頁面
+        
+        self._lock = threading.Lock()
+        self.setup_logging()
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_size = self._scan_total_size()
+    
+    def setup_logging(self):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger(__name__)
+    
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+    
+    def _paths(self, url: str):
+        # 以網址雜湊為檔名，前兩碼作為子目錄避免單一目錄檔案過多
+        key = self._key(url)
+        subdir = os.path.join(self.cache_dir, key[:2])
+        return subdir, os.path.join(subdir, f"{key}.html.gz"), os.path.join(subdir, f"{key}.json")
+    
+    def _scan_total_size(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+        return total
+    
+    def _write_atomic(self, path: str, data: bytes) -> int:
+        tmp_path = f"{path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+    
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        _, body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with gzip.open(body_path, 'rt', encoding='utf-8') as f:
+                meta['text'] = f.read()
+            return meta
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error(f"讀取頁面快取失敗: {url}, 錯誤: {e}")
+            return None
+    
+    def is_fresh(self, entry: Dict[str, Any], max_age: Optional[float] = None) -> bool:
+        max_age = self.ttl if max_age is None else max_age
+        return time.time() - entry.get('fetched_at', 0) < max_age
+    
+    def put(self, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        subdir, body_path, meta_path = self._paths(url)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time()
+        }
+        
+        try:
+            os.makedirs(subdir, exist_ok=True)
+            with self._lock:
+                old_size = sum(os.path.getsize(p) for p in (body_path, meta_path) if os.path.exists(p))
+                new_size = self._write_atomic(body_path, gzip.compress(text.encode('utf-8')))
+                new_size += self._write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+                self._total_size += new_size - old_size
+            
+            if self._total_size > self.max_size_bytes:
+                self.evict()
+        except Exception as e:
+            self.logger.error(f"寫入頁面快取失敗: {url}, 錯誤: {e}")
+    
+    def touch(self, url: str):
+        # 伺服器回應304時更新取得時間，內容沿用快取
+        entry = self.get(url)
+        if entry:
+            self.put(url, entry['text'], entry.get('etag'), entry.get('last_modified'))
+    
+    def evict(self):
+        # 依最後寫入時間淘汰最舊的頁面，直到總大小降至上限的九成
+        with self._lock:
+            entries = []
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith('.json'):
+                        meta_path = os.path.join(root, name)
+                        body_path = meta_path[:-len('.json')] + '.html.gz'
+                        try:
+                            entries.append((os.path.getmtime(meta_path), meta_path, body_path))
+                        except OSError:
+                            continue
+            
+            entries.sort()
+            target = self.max_size_bytes * 0.9
+            removed = 0
+            for _, meta_path, body_path in entries:
+                if self._total_size <= target:
+                    break
+                for path in (meta_path, body_path):
+                    try:
+                        self._total_size -= os.path.getsize(path)
+                        os.remove(path)
+                    except OSError:
+                        continue
+                removed += 1
+        
+        self.logger.info(f"頁面快取淘汰 {removed} 個頁面，目前大小 {self._total_size / 1024 ** 2:.1f} MB")
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'cache_dir': self.cache_dir,
+            'total_size_bytes': self._total_size,
+            'max_size_bytes': self.max_size_bytes
+        }
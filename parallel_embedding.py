@@ -0,0 +1,80 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+from embedding_cache import EmbeddingCache
+from vector_processor import VectorProcessor
+
+# 子行程各自持有的詞向量處理器，由 initializer 載入一次
+_worker_processor = None
+
+def _init_worker(processor_options: Dict[str, Any]):
+    global _worker_processor
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - %(levelname)s - [pid {os.getpid()}] %(message)s')
+    _worker_processor = VectorProcessor(**processor_options)
+
+def _embed_shard(articles: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[str, int, bytes]]]:
+    # 回傳詞向量結果與本分片新編碼、尚未寫入快取的項目
+    results = _worker_processor.batch_compute_vectors(articles)
+    cache = _worker_processor.embedding_cache
+    return results, cache.take_pending_rows() if cache else []
+
+def iter_vectors_parallel(articles: List[Dict[str, Any]],
+                          workers: int = 4,
+                          processor_options: Optional[Dict[str, Any]] = None,
+                          shard_size: int = 500,
+                          max_pending_shards: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    # 將文章切成多個分片交給行程池計算詞向量，每完成一個分片就回傳其結果
+    # 結果由呼叫端（單一寫入者）寫回資料庫，子行程不碰資料庫，避免SQLite鎖定競爭
+    # 詞向量快取亦同：子行程只讀取快取檔，新編碼的項目隨結果傳回，由父行程寫入
+    logger = logging.getLogger(__name__)
+    processor_options = dict(processor_options or {})
+    
+    # 每個行程只分配部分核心，避免各行程的推論執行緒互相搶佔
+    processor_options.setdefault('num_threads', max(1, (os.cpu_count() or 1) // workers))
+    max_pending_shards = max_pending_shards or workers * 2
+    
+    # 父行程先建立快取檔（WAL模式），子行程以唯讀方式開啟
+    cache_writer = None
+    if processor_options.get('cache_path'):
+        cache_writer = EmbeddingCache(processor_options['cache_path'])
+        processor_options['cache_read_only'] = True
+    
+    shards = [articles[start:start + shard_size] for start in range(0, len(articles), shard_size)]
+    logger.info(f"開始平行計算詞向量: {len(articles)} 篇文章，{len(shards)} 個分片，{workers} 個行程，"
+                f"每行程 {processor_options['num_threads']} 個執行緒")
+    
+    try:
+        # 父行程可能已載入PyTorch並啟動執行緒，以 spawn 建立子行程避免 fork 後死結
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(processor_options,)) as executor:
+            pending = {}
+            next_shard = 0
+            completed = 0
+            
+            while next_shard < len(shards) or pending:
+                # 限制同時排隊的分片數，避免一次把全部文章序列化送出
+                while next_shard < len(shards) and len(pending) < max_pending_shards:
+                    pending[executor.submit(_embed_shard, shards[next_shard])] = next_shard
+                    next_shard += 1
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard_index = pending.pop(future)
+                    try:
+                        results, cache_rows = future.result()
+                    except Exception as e:
+                        logger.error(f"第 {shard_index + 1} 個分片計算詞向量失敗: {e}")
+                        continue
+                    
+                    if cache_writer:
+                        cache_writer.put_rows(cache_rows)
+                    completed += 1
+                    logger.info(f"已完成 {completed}/{len(shards)} 個分片")
+                    yield results
+    finally:
+        if cache_writer:
+            cache_writer.close()
@@ -1,34 +1,333 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import time
 import re
+import random
 from datetime import datetime
 import logging
+import threading
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from lxml import html as lxml_html
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_html = None
+    lxml_etree = None
+
+# 依class名稱比對元素（等同BeautifulSoup的class_比對）
+def _class_xpath(tag, class_name):
+    return f'{tag}[contains(concat(" ", normalize-space(@class), " "), " {class_name} ")]'
+
+# 取得元素的純文字（等同BeautifulSoup的get_text(strip=True)）
+def _stripped_text(element):
+    return ''.join(text.strip() for text in element.xpath('.//text()'))
+
+class RateLimiter:
+    # 令牌桶限速器，所有執行緒共用同一個全域速率；傳入 shared_state 時可跨行程共用
+    # 速率與暫停時間也存於共享狀態，任一行程的斷路器降速或暫停時，所有行程一併套用
+    def __init__(self, rate, burst=None, shared_state=None):
+        self.capacity = float(burst) if burst else max(1.0, float(rate))
+        if shared_state is not None:
+            self._state = shared_state  # [剩餘令牌數, 上次補充時間, 每秒請求數, 暫停至何時]
+            self._lock = shared_state.get_lock()
+        else:
+            self._state = [self.capacity, time.monotonic(), float(rate), 0.0]
+            self._lock = threading.Lock()
+    
+    @staticmethod
+    def create_shared_state(rate, burst=None):
+        # 建立可傳給子行程的共享令牌桶狀態
+        capacity = float(burst) if burst else max(1.0, float(rate))
+        return multiprocessing.Array('d', [capacity, time.monotonic(), float(rate), 0.0])
+    
+    @property
+    def rate(self):
+        # 每秒允許的請求數，<= 0 表示不限速
+        return self._state[2]
+    
+    @property
+    def paused_until(self):
+        return self._state[3]
+    
+    def acquire(self):
+        while True:
+            with self._lock:
+                rate = self._state[2]
+                if rate <= 0:
+                    return
+                now = time.monotonic()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * rate)
+                self._state[1] = now
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / rate
+            time.sleep(wait)
+    
+    def set_rate(self, rate):
+        with self._lock:
+            self._state[2] = float(rate)
+    
+    def pause(self, seconds):
+        # 暫停送出請求 seconds 秒，已暫停更久時不縮短
+        with self._lock:
+            self._state[3] = max(self._state[3], time.monotonic() + seconds)
+
+class CircuitBreaker:
+    # 依近期錯誤率自動調整請求速率：錯誤率升高時速率減半，嚴重時暫停一段時間，恢復正常後逐步加回
+    # 錯誤率以各行程自己的請求統計，調整的速率與暫停則作用於（可能跨行程共用的）限速器
+    def __init__(self, rate_limiter, window=50, slow_threshold=0.2, open_threshold=0.5,
+                 cooldown=30.0, min_rate=0.2, target_rate=None):
+        self.rate_limiter = rate_limiter
+        # 設定的速率上限，恢復時不會超過；共用限速器時可能已被其他行程降速，需明確傳入
+        self.target_rate = rate_limiter.rate if target_rate is None else float(target_rate)
+        self.window = window
+        self.slow_threshold = slow_threshold
+        self.open_threshold = open_threshold
+        self.cooldown = cooldown
+        self.min_rate = min_rate
+        self.trips = 0
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        # 斷路器開啟期間暫停送出請求
+        delay = self.rate_limiter.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def record(self, success):
+        with self._lock:
+            self._outcomes.append(success)
+            if len(self._outcomes) < self.window or self.target_rate <= 0:
+                return None
+            
+            error_rate = self._outcomes.count(False) / len(self._outcomes)
+            current_rate = self.rate_limiter.rate
+            
+            if error_rate >= self.slow_threshold:
+                if error_rate >= self.open_threshold:
+                    self.rate_limiter.pause(self.cooldown)
+                self.rate_limiter.set_rate(max(self.min_rate, current_rate / 2))
+                self.trips += 1
+                self._outcomes.clear()
+                return error_rate
+            
+            if error_rate < self.slow_threshold / 2 and current_rate < self.target_rate:
+                self.rate_limiter.set_rate(min(self.target_rate, current_rate * 1.25))
+                self._outcomes.clear()
+            
+            return None
 
 class PTTCrawler:
-    def __init__(self):
-        self.base_url = "https://www.ptt.cc"
-        self.gossiping_url = "https://www.ptt.cc/bbs/Gossiping/index.html"
+    def __init__(self, board='Gossiping', max_workers=8, requests_per_second=5.0, page_cache=None, offline=False,
+                 parser='lxml', connect_timeout=5.0, read_timeout=20.0, max_retries=4, backoff_base=1.0,
+                 backoff_max=60.0, rate_limit_state=None, base_url="https://www.ptt.cc"):
+        # rate_limit_state: RateLimiter.create_shared_state() 建立的共享狀態，多行程爬取時共用速率預算
+        self.board = board
+        self.base_url = base_url
+        self.board_url = f"{self.base_url}/bbs/{self.board}/index.html"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.session = requests.Session()
         self.session.headers.update(self.headers)
         
+        # 併發設定：max_workers 為同時進行中的請求上限，requests_per_second 為全域速率上限
+        self.max_workers = max(1, int(max_workers))
+        self.rate_limiter = RateLimiter(requests_per_second, shared_state=rate_limit_state)
+        
+        # 連線池大小配合併發數，避免執行緒等待或丟棄連線
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # 逾時與重試：429/5xx 與連線錯誤以指數退避加隨機抖動重試，錯誤率升高時由斷路器降速
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = CircuitBreaker(self.rate_limiter, target_rate=requests_per_second)
+        self.status_counts = Counter()
+        self.retry_count = 0
+        self._stats_lock = threading.Lock()
+        
+        # 原始HTML快取：page_cache 為 PageCache 實例，offline 時只從快取重播不連網
+        self.page_cache = page_cache
+        self.offline = offline
+        
+        # 目前爬取進度（索引頁網址、已完成頁數、本頁尚未完成的文章網址）
+        self.crawl_state = None
+        
+        # 解析器：預設使用lxml，未安裝時退回BeautifulSoup的html.parser
+        self.use_lxml = parser == 'lxml' and lxml_html is not None
+        
         # 設定logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
     
-    def get_page_content(self, url):
+    def get_page_content(self, url, max_age=None):
+        # max_age: 快取可直接使用的秒數，None 表示使用快取預設TTL
         try:
-            response = self.session.get(url)
+            cached = self.page_cache.get(url) if self.page_cache else None
+            if cached and (self.offline or self.page_cache.is_fresh(cached, max_age)):
+                return cached['text']
+            
+            if self.offline:
+                self.logger.warning(f"離線重播模式下快取中沒有此頁面: {url}")
+                return None
+            
+            # 快取過期時帶上ETag/Last-Modified做條件式請求
+            headers = {}
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
+            
+            response = self.request_with_retry(url, headers)
+            
+            if response.status_code == 304 and cached:
+                self.page_cache.touch(url)
+                return cached['text']
+            
             response.raise_for_status()
+            
+            if self.page_cache:
+                self.page_cache.put(
+                    url,
+                    response.text,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
+                )
             return response.text
         except Exception as e:
             self.logger.error(f"取得頁面失敗: {url}, 錯誤: {e}")
             return None
     
+    def is_retryable_status(self, status_code):
+        return status_code == 429 or status_code >= 500
+    
+    def compute_backoff(self, attempt, retry_after=None):
+        # 伺服器有給Retry-After時優先採用，否則以指數退避加上full jitter
+        if retry_after and retry_after.isdigit():
+            return min(self.backoff_max, float(retry_after))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def record_response(self, status):
+        # status 為HTTP狀態碼，連線錯誤或逾時以例外類別名稱記錄
+        with self._stats_lock:
+            self.status_counts[status] += 1
+        
+        success = isinstance(status, int) and not self.is_retryable_status(status)
+        error_rate = self.circuit_breaker.record(success)
+        if error_rate is not None:
+            self.logger.warning(f"近期錯誤率 {error_rate:.0%}，請求速率降為每秒 {self.rate_limiter.rate:.2f} 次")
+    
+    def request_with_retry(self, url, headers=None):
+        for attempt in range(self.max_retries + 1):
+            self.circuit_breaker.wait()
+            self.rate_limiter.acquire()
+            
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.record_response(type(e).__name__)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.compute_backoff(attempt)
+                self.logger.warning(f"連線失敗，{delay:.1f}秒後重試 ({attempt + 1}/{self.max_retries}): {url}, 錯誤: {e}")
+            else:
+                self.record_response(response.status_code)
+                if not self.is_retryable_status(response.status_code) or attempt >= self.max_retries:
+                    return response
+                delay = self.compute_backoff(attempt, response.headers.get('Retry-After'))
+                self.logger.warning(f"伺服器回應 {response.status_code}，{delay:.1f}秒後重試 ({attempt + 1}/{self.max_retries}): {url}")
+            
+            with self._stats_lock:
+                self.retry_count += 1
+            time.sleep(delay)
+    
+    def get_http_stats(self):
+        with self._stats_lock:
+            status_counts = dict(self.status_counts)
+            retry_count = self.retry_count
+        
+        return {
+            'requests': sum(status_counts.values()),
+            'status_counts': status_counts,
+            'retries': retry_count,
+            'breaker_trips': self.circuit_breaker.trips,
+            'current_rate': self.rate_limiter.rate
+        }
+    
+    def parse_index_page(self, html_content):
+        # 單次解析索引頁，同時回傳文章列表與上一頁連結
+        # lxml 無法解析空白或損壞的頁面（ParserError/XMLSyntaxError）時改用BeautifulSoup，不中斷爬取
+        if self.use_lxml:
+            try:
+                return self._parse_index_page_lxml(html_content)
+            except lxml_etree.LxmlError as e:
+                self.logger.warning(f"lxml解析索引頁失敗，改用BeautifulSoup: {e}")
+        return self._parse_index_page_bs4(html_content)
+    
     def parse_article_list(self, html_content):
+        articles, _ = self.parse_index_page(html_content)
+        return articles
+    
+    def _parse_index_page_lxml(self, html_content):
+        doc = lxml_html.document_fromstring(html_content)
+        articles = []
+        
+        for item in doc.xpath('//' + _class_xpath('div', 'r-ent')):
+            try:
+                # 取得標題和連結
+                title_links = item.xpath('.//' + _class_xpath('div', 'title') + '[1]//a[1]')
+                if not title_links:
+                    continue
+                
+                title_link = title_links[0]
+                title = _stripped_text(title_link)
+                article_url = self.base_url + title_link.get('href', '')
+                
+                # 取得作者
+                author_elements = item.xpath('.//' + _class_xpath('div', 'author'))
+                author = _stripped_text(author_elements[0]) if author_elements else "匿名"
+                
+                # 取得時間
+                date_elements = item.xpath('.//' + _class_xpath('div', 'date'))
+                date = _stripped_text(date_elements[0]) if date_elements else ""
+                
+                # 跳過已刪除的文章
+                if title.startswith('(本文已被刪除)'):
+                    continue
+                
+                articles.append({
+                    'title': title,
+                    'author': author,
+                    'date': date,
+                    'url': article_url,
+                    'board': self.board
+                })
+                
+            except Exception as e:
+                self.logger.error(f"解析文章項目失敗: {e}")
+                continue
+        
+        # 找到上一頁連結
+        prev_url = None
+        prev_links = doc.xpath('//a[.="‹ 上頁"]')
+        if prev_links and prev_links[0].get('href'):
+            prev_url = self.base_url + prev_links[0].get('href')
+        
+        return articles, prev_url
+    
+    def _parse_index_page_bs4(self, html_content):
         soup = BeautifulSoup(html_content, 'html.parser')
         articles = []
         
@@ -62,16 +361,59 @@ class PTTCrawler:
                     'title': title,
                     'author': author,
                     'date': date,
-                    'url': article_url
+                    'url': article_url,
+                    'board': self.board
                 })
                 
             except Exception as e:
                 self.logger.error(f"解析文章項目失敗: {e}")
                 continue
         
-        return articles
+        # 找到上一頁連結
+        prev_url = None
+        prev_link = soup.find('a', string='‹ 上頁')
+        if prev_link and prev_link.get('href'):
+            prev_url = self.base_url + prev_link.get('href')
+        
+        return articles, prev_url
     
     def parse_article_content(self, html_content):
+        if self.use_lxml:
+            try:
+                return self._parse_article_content_lxml(html_content)
+            except lxml_etree.LxmlError as e:
+                self.logger.warning(f"lxml解析文章失敗，改用BeautifulSoup: {e}")
+        return self._parse_article_content_bs4(html_content)
+    
+    def _parse_article_content_lxml(self, html_content):
+        doc = lxml_html.document_fromstring(html_content)
+        
+        # 找到文章內容區域
+        main_contents = doc.xpath('//div[@id="main-content"]')
+        if not main_contents:
+            return None
+        main_content = main_contents[0]
+        
+        # 移除不需要的元素（drop_tree 會保留元素後方的文字）
+        removable = ' | '.join(
+            './/' + _class_xpath(tag, class_name)
+            for tag in ('div', 'span')
+            for class_name in ('article-metaline', 'article-metaline-right', 'push')
+        )
+        for element in main_content.xpath(removable):
+            element.drop_tree()
+        
+        # 取得純文字內容（與BeautifulSoup的get_text(strip=True)相同，略過script/style）
+        texts = main_content.xpath('.//text()[not(parent::script) and not(parent::style)]')
+        content = ''.join(text.strip() for text in texts)
+        
+        # 清理內容
+        content = re.sub(r'\n+', '\n', content)
+        content = re.sub(r'\s+', ' ', content)
+        
+        return content.strip()
+    
+    def _parse_article_content_bs4(self, html_content):
         soup = BeautifulSoup(html_content, 'html.parser')
         
         # 找到文章內容區域
@@ -94,56 +436,98 @@ class PTTCrawler:
         
         return content.strip()
     
-    def crawl_daily_articles(self, pages=30):
-        self.logger.info(f"開始爬取PTT八卦版前{pages}頁文章")
+    def fetch_article(self, article):
+        # 取得單篇文章內容，失敗時回傳None
+        try:
+            self.logger.info(f"正在爬取文章: {article['title']}")
+            
+            article_html = self.get_page_content(article['url'])
+            if article_html:
+                content = self.parse_article_content(article_html)
+                if content:
+                    article['content'] = content
+                    return article
+        except Exception as e:
+            self.logger.error(f"爬取文章內容失敗: {article['title']}, 錯誤: {e}")
         
-        all_articles = []
-        current_url = self.gossiping_url
+        return None
+    
+    def iter_daily_articles(self, pages=30, known_urls_lookup=None, checkpoint=None, stop_at_known_page=True):
+        # 逐篇產出解析完成的文章，記憶體用量不隨爬取頁數增加
+        # known_urls_lookup: 接收網址清單並回傳已儲存網址集合的函式，提供時只爬取新文章
+        # checkpoint: 先前儲存的 crawl_state，提供時從該索引頁與未完成的文章繼續
+        # stop_at_known_page: 整頁都已儲存時是否停止往前翻頁（長時間回補時關閉）
+        self.logger.info(f"開始爬取PTT {self.board} 版前{pages}頁文章 (併發數: {self.max_workers}, 每秒請求上限: {self.rate_limiter.rate})")
         
-        for page in range(pages):
-            self.logger.info(f"正在爬取第{page + 1}頁: {current_url}")
-            
-            # 取得頁面內容
-            html_content = self.get_page_content(current_url)
-            if not html_content:
-                continue
-            
-            # 解析文章列表
-            articles = self.parse_article_list(html_content)
-            
-            # 爬取每篇文章的詳細內容
-            for article in articles:
-                try:
-                    self.logger.info(f"正在爬取文章: {article['title']}")
-                    
-                    # 取得文章內容
-                    article_html = self.get_page_content(article['url'])
-                    if article_html:
-                        content = self.parse_article_content(article_html)
-                        if content:
-                            article['content'] = content
-                            all_articles.append(article)
-                    
-                    # 避免請求過於頻繁
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    self.logger.error(f"爬取文章內容失敗: {article['title']}, 錯誤: {e}")
+        article_count = 0
+        current_url = self.board_url
+        start_page = 0
+        pending_urls = None
+        
+        if checkpoint:
+            current_url = checkpoint['current_url']
+            start_page = checkpoint['pages_done']
+            pending_urls = checkpoint.get('pending_urls')
+            self.logger.info(f"從檢查點繼續: 已完成{start_page}頁，目前索引頁 {current_url}")
+        
+        # crawl_state 記錄目前進度，消費端寫入資料庫後可存成檢查點
+        self.crawl_state = {'current_url': current_url, 'pages_done': start_page, 'pending_urls': pending_urls}
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for page in range(start_page, pages):
+                if not current_url:
+                    break
+                
+                self.logger.info(f"正在爬取第{page + 1}頁: {current_url}")
+                
+                # 取得頁面內容（索引頁持續更新，快取一律重新驗證）
+                html_content = self.get_page_content(current_url, max_age=0)
+                if not html_content:
                     continue
-            
-            # 找到下一頁連結
-            soup = BeautifulSoup(html_content, 'html.parser')
-            prev_link = soup.find('a', string='‹ 上頁')
-            if prev_link and prev_link.get('href'):
-                current_url = self.base_url + prev_link.get('href')
-            else:
-                break
-            
-            # 避免請求過於頻繁
-            time.sleep(2)
+                
+                # 解析文章列表與上一頁連結
+                articles, prev_url = self.parse_index_page(html_content)
+                
+                # 從檢查點繼續時，第一頁只處理尚未完成的文章
+                if pending_urls is not None:
+                    pending_set = set(pending_urls)
+                    articles = [article for article in articles if article['url'] in pending_set]
+                    pending_urls = None
+                
+                # 增量爬取：先批次比對資料庫，整頁都已儲存時停止往前翻頁
+                if known_urls_lookup and articles:
+                    known_urls = known_urls_lookup([article['url'] for article in articles])
+                    new_articles = [article for article in articles if article['url'] not in known_urls]
+                    self.logger.info(f"第{page + 1}頁共{len(articles)}篇，其中{len(new_articles)}篇為新文章")
+                    if not new_articles and stop_at_known_page:
+                        self.logger.info("本頁文章皆已存在資料庫，停止往前翻頁")
+                        break
+                    articles = new_articles
+                
+                remaining_urls = [article['url'] for article in articles]
+                self.crawl_state = {'current_url': current_url, 'pages_done': page, 'pending_urls': remaining_urls}
+                
+                # 併發爬取每篇文章的詳細內容，map 會依原順序回傳結果
+                if self.max_workers > 1:
+                    fetched = executor.map(self.fetch_article, articles)
+                else:
+                    fetched = map(self.fetch_article, articles)
+                
+                for i, article in enumerate(fetched):
+                    self.crawl_state['pending_urls'] = remaining_urls[i + 1:]
+                    if article:
+                        article_count += 1
+                        yield article
+                
+                # 前往上一頁
+                current_url = prev_url
+                self.crawl_state = {'current_url': current_url, 'pages_done': page + 1, 'pending_urls': None}
         
-        self.logger.info(f"爬取完成，共取得{len(all_articles)}篇文章")
-        return all_articles
+        self.logger.info(f"爬取完成，共取得{article_count}篇文章")
+        self.logger.info(f"HTTP統計: {self.get_http_stats()}")
+    
+    def crawl_daily_articles(self, pages=30, known_urls_lookup=None):
+        return list(self.iter_daily_articles(pages=pages, known_urls_lookup=known_urls_lookup))
     
     def get_today_articles(self):
     #測試用，取得今日文章
@@ -1,28 +1,80 @@
-import json
+import time
 import logging
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import torch
 import numpy as np
-import pandas as pd
 from database_manager import DatabaseManager
 from vector_processor import VectorProcessor
+from vector_index import VectorIndex
+
+# vector: 只以詞向量檢索；hybrid: 關鍵字（BM25）與詞向量檢索同時進行，以 reciprocal rank fusion 合併
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+def reciprocal_rank_fusion(rankings: List[List[int]], weights: Optional[List[float]] = None,
+                           k: int = 60) -> List[Tuple[int, float]]:
+    # 每份排序中第 r 名（從1起算）貢獻 weight / (k + r)，只看名次不看原始分數，不需校正BM25與餘弦相似度的尺度
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
 
 class RAGSystem:
     def __init__(self, 
                  taide_model_path: str = "taide/TAIDE-LX-7B-Chat",
                  db_path: str = "ptt_articles.db",
-                 vector_model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+                 vector_model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 embedding_backend: str = "torch",
+                 use_chunks: bool = True,
+                 max_chunks_per_article: int = 2,
+                 chunk_weight: float = 0.5,
+                 pca_path: Optional[str] = None,
+                 index_refresh_interval: float = 60.0,
+                 index_type: str = "flat",
+                 index_options: Optional[Dict[str, Any]] = None,
+                 retrieval_mode: str = "vector",
+                 keyword_weight: float = 1.0,
+                 vector_weight: float = 1.0,
+                 rrf_k: int = 60,
+                 hybrid_candidates: int = 50):
 
         self.taide_model_path = taide_model_path#taide_model_path: TAIDE模型路徑
         self.db_path = db_path#db_path: 資料庫路徑
         self.vector_model_name = vector_model_name #vector_model_name: 詞向量模型名稱
+        self.embedding_backend = embedding_backend #embedding_backend: 詞向量後端，torch 或 onnx
+        self.use_chunks = use_chunks #use_chunks: 以內文片段檢索，提示詞只放入最相關的片段
+        self.max_chunks_per_article = max_chunks_per_article #max_chunks_per_article: 每篇文章最多放入提示詞的片段數
+        self.chunk_weight = chunk_weight #chunk_weight: 片段檢索時最相關片段相似度的權重，其餘為整篇文章（標題＋內容融合向量）相似度的權重
+        self.pca_path = pca_path #pca_path: PCA降維參數檔，需與計算詞向量時相同
+        self.index_refresh_interval = index_refresh_interval #index_refresh_interval: 檢查新計算詞向量並加入常駐索引的最短間隔（秒）
+        self.index_type = index_type #index_type: 向量索引類型，flat（精確）、hnsw 或 ivfpq
+        self.index_options = dict(index_options or {}) #index_options: 索引參數，如 ef_search、nprobe、pq_m
+        self.retrieval_mode = retrieval_mode #retrieval_mode: 檢索模式，vector 或 hybrid
+        self.keyword_weight = keyword_weight #keyword_weight: 混合檢索時BM25排序的融合權重
+        self.vector_weight = vector_weight #vector_weight: 混合檢索時詞向量排序的融合權重
+        self.rrf_k = rrf_k #rrf_k: reciprocal rank fusion 的平滑常數，越大名次間的分數差距越小
+        self.hybrid_candidates = hybrid_candidates #hybrid_candidates: 混合檢索時每種檢索取回的候選文章數
+        
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"不支援的檢索模式: {retrieval_mode}，可用: {', '.join(RETRIEVAL_MODES)}")
         
         self.tokenizer = None
         self.model = None
         self.db_manager = None
         self.vector_processor = None
         
+        # 常駐記憶體的向量索引：文章以標題/內容融合向量建立，片段另建一個索引
+        self.article_index = None
+        self.chunk_index = None
+        self.chunk_article_ids = {}
+        self.article_chunk_ids = {}
+        self.index_synced_at = None
+        self.index_checked_at = 0.0
+        self.retrieval_executor = None
+        
         self.setup_logging()
         self.load_components()
     
@@ -46,18 +98,124 @@ class RAGSystem:
             # 初始化資料庫管理器
             self.logger.info("正在初始化資料庫...")
             self.db_manager = DatabaseManager(self.db_path)
+            self.db_manager.normalize_legacy_vectors()
             self.logger.info("資料庫初始化完成")
             
             # 初始化詞向量處理器
             self.logger.info("正在初始化詞向量處理器...")
-            self.vector_processor = VectorProcessor(self.vector_model_name)
+            self.vector_processor = VectorProcessor(self.vector_model_name, backend=self.embedding_backend,
+                                                    reducer_path=self.pca_path)
+            # 查詢詞向量須與已儲存的詞向量以同一組PCA參數降維
+            self.db_manager.check_vector_reduction(self.vector_processor.reducer)
             self.logger.info("詞向量處理器初始化完成")
             
+            # 建立常駐向量索引
+            self.logger.info("正在建立向量索引...")
+            self.build_vector_index()
+            
         except Exception as e:
             self.logger.error(f"載入組件失敗: {e}")
             raise
     
+    def build_vector_index(self):
+        # 啟動時由資料庫載入所有詞向量建立索引，之後由 refresh_vector_index 增量加入
+        self.article_index = None
+        self.chunk_index = None
+        self.chunk_article_ids = {}
+        self.article_chunk_ids = {}
+        self.index_synced_at = self.db_manager.current_timestamp()
+        self.index_checked_at = time.monotonic()
+        
+        article_ids, title_matrix, content_matrix, normalized = self.db_manager.get_article_vector_arrays(
+            self.vector_model_name
+        )
+        self.add_article_vectors(article_ids, title_matrix, content_matrix, normalized)
+        if self.use_chunks:
+            self.add_chunk_vectors(*self.db_manager.get_chunk_vector_arrays(model_name=self.vector_model_name))
+        
+        self.logger.info(f"向量索引建立完成: {self.article_index.ntotal if self.article_index else 0} 篇文章，"
+                         f"{self.chunk_index.ntotal if self.chunk_index else 0} 個片段")
+    
+    def refresh_vector_index(self, force: bool = False) -> int:
+        # 將上次同步後被刪除的詞向量移出索引，再加入新計算（或重新計算）的詞向量，回傳更新的文章數
+        if not force and time.monotonic() - self.index_checked_at < self.index_refresh_interval:
+            return 0
+        
+        try:
+            synced_at = self.db_manager.current_timestamp()
+            
+            # 文章被清理或內容變更使詞向量失效時，不再出現在檢索結果中
+            removed_ids = self.db_manager.get_removed_vector_ids(self.index_synced_at)
+            if removed_ids and self.article_index is not None:
+                self.article_index.remove(removed_ids)
+            if removed_ids and self.use_chunks:
+                self.remove_article_chunks(removed_ids)
+            
+            article_ids, title_matrix, content_matrix, normalized = self.db_manager.get_article_vector_arrays(
+                self.vector_model_name, updated_since=self.index_synced_at
+            )
+            self.add_article_vectors(article_ids, title_matrix, content_matrix, normalized)
+            
+            if self.use_chunks and len(article_ids):
+                # 重新計算的文章片段id會改變，先移除舊片段
+                self.remove_article_chunks(article_ids.tolist())
+                self.add_chunk_vectors(*self.db_manager.get_chunk_vector_arrays(
+                    article_ids.tolist(), model_name=self.vector_model_name
+                ))
+            
+            self.index_synced_at = synced_at
+            self.index_checked_at = time.monotonic()
+            if len(article_ids) or removed_ids:
+                self.logger.info(f"向量索引已加入 {len(article_ids)} 篇新計算詞向量的文章，移除 {len(removed_ids)} 篇")
+            return len(article_ids) + len(removed_ids)
+        except Exception as e:
+            self.logger.error(f"更新向量索引失敗: {e}")
+            return 0
+    
+    def remove_article_chunks(self, article_ids: List[int]) -> int:
+        # 從片段索引移除這些文章的所有片段
+        stale_chunk_ids = [chunk_id for article_id in article_ids
+                           for chunk_id in self.article_chunk_ids.pop(article_id, [])]
+        if self.chunk_index is not None and stale_chunk_ids:
+            self.chunk_index.remove(stale_chunk_ids)
+        for chunk_id in stale_chunk_ids:
+            self.chunk_article_ids.pop(chunk_id, None)
+        return len(stale_chunk_ids)
+    
+    def add_article_vectors(self, article_ids: np.ndarray, title_matrix: np.ndarray,
+                            content_matrix: np.ndarray, normalized: np.ndarray):
+        if not len(article_ids):
+            return
+        
+        # 向量未全部正規化時先逐列正規化，融合向量的內積才等於綜合相似度
+        if not normalized.all():
+            title_matrix = self.vector_processor.normalize_rows(np.array(title_matrix))
+            content_matrix = self.vector_processor.normalize_rows(np.array(content_matrix))
+        
+        if self.article_index is None:
+            self.article_index = VectorIndex(title_matrix.shape[1], self.index_type, **self.index_options)
+        self.article_index.add(article_ids, self.vector_processor.fuse_vectors(title_matrix, content_matrix))
+    
+    def add_chunk_vectors(self, chunk_ids: np.ndarray, chunk_article_ids: np.ndarray,
+                          chunk_matrix: np.ndarray, normalized: np.ndarray):
+        if not len(chunk_ids):
+            return
+        
+        if not normalized.all():
+            chunk_matrix = self.vector_processor.normalize_rows(np.array(chunk_matrix))
+        
+        if self.chunk_index is None:
+            self.chunk_index = VectorIndex(chunk_matrix.shape[1], self.index_type, **self.index_options)
+        self.chunk_index.add(chunk_ids, chunk_matrix)
+        
+        for chunk_id, article_id in zip(chunk_ids.tolist(), chunk_article_ids.tolist()):
+            self.chunk_article_ids[chunk_id] = article_id
+            self.article_chunk_ids.setdefault(article_id, []).append(chunk_id)
+    
     def search_relevant_articles(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        if self.retrieval_mode == "hybrid":
+            return self.search_hybrid(query, top_k)
+        
         try:
             # 計算查詢的詞向量
             query_vector = self.vector_processor.compute_title_vector(query)
@@ -66,50 +224,166 @@ class RAGSystem:
                 self.logger.warning("無法計算查詢詞向量")
                 return []
             
-            # 取得所有文章的詞向量
-            articles_df = self.db_manager.get_all_articles()
+            self.refresh_vector_index()
             
-            if articles_df.empty:
-                self.logger.warning("資料庫中沒有文章")
+            matches = self.rank_by_vector(query_vector, top_k)
+            if not matches:
+                self.logger.warning("資料庫中沒有已計算詞向量的文章")
                 return []
             
-            # 準備文章向量資料
-            article_vectors = []
-            for _, row in articles_df.iterrows():
-                if pd.notna(row['title_vector']) and pd.notna(row['content_vector']):
-                    try:
-                        title_vector = json.loads(row['title_vector'])
-                        content_vector = json.loads(row['content_vector'])
-                        
-                        article_vectors.append({
-                            'id': row['id'],
-                            'title': row['title'],
-                            'title_vector': title_vector,
-                            'content_vector': content_vector
-                        })
-                    except:
-                        continue
+            return self.fetch_ranked_articles(matches)
             
-            # 找到相似文章
-            similar_articles = self.vector_processor.find_similar_articles(
-                query_vector, article_vectors, top_k
-            )
+        except Exception as e:
+            self.logger.error(f"搜尋相關文章失敗: {e}")
+            return []
+    
+    def search_hybrid(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        # 關鍵字（BM25）與詞向量同時檢索，以 reciprocal rank fusion 合併兩份排序
+        # 詞向量檢索（計算查詢詞向量與索引查詢，不碰資料庫）在背景執行緒進行；
+        # SQLite 連線只能在建立它的執行緒使用，BM25 檢索留在呼叫端執行緒
+        try:
+            self.refresh_vector_index()
+            candidates = max(top_k, self.hybrid_candidates)
             
-            # 取得完整文章資訊
-            results = []
-            for article in similar_articles:
-                article_info = self.db_manager.search_articles_by_keyword(
-                    article['title'], limit=1
-                )
-                if article_info:
-                    article_info[0]['similarity'] = article['similarity']
-                    results.append(article_info[0])
+            if self.retrieval_executor is None:
+                self.retrieval_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-retrieval")
+            vector_future = self.retrieval_executor.submit(self.rank_query_by_vector, query, candidates)
+            
+            # 兩個字的人名、數字無法以 trigram 全文索引比對，另以 LIKE 檢索，作為關鍵字的第二份排序
+            bm25_matches = self.db_manager.search_articles_bm25(query, candidates)
+            short_term_matches = self.db_manager.search_articles_short_terms(query, candidates)
+            try:
+                vector_matches = vector_future.result()
+            except Exception as e:
+                self.logger.error(f"詞向量檢索失敗，只使用關鍵字結果: {e}")
+                vector_matches = []
+            
+            if not bm25_matches and not short_term_matches:
+                self.logger.warning("關鍵字檢索沒有結果（問題中沒有可比對的詞或沒有文章命中），本次只依詞向量排序")
+            
+            fused = reciprocal_rank_fusion(
+                [[match['id'] for match in vector_matches],
+                 [match['id'] for match in bm25_matches],
+                 [match['id'] for match in short_term_matches]],
+                [self.vector_weight, self.keyword_weight, self.keyword_weight],
+                self.rrf_k
+            )[:top_k]
+            if not fused:
+                self.logger.warning("關鍵字與詞向量檢索皆沒有結果")
+                return []
+            
+            vector_by_id = {match['id']: match for match in vector_matches}
+            # 關鍵字分數以BM25為主，只有短詞命中的文章顯示命中短詞數
+            keyword_by_id = {match['id']: match for match in short_term_matches}
+            keyword_by_id.update((match['id'], match) for match in bm25_matches)
+            matches = []
+            for article_id, fusion_score in fused:
+                match = dict(vector_by_id.get(article_id, {'id': article_id}))
+                match['fusion_score'] = fusion_score
+                if article_id in keyword_by_id:
+                    match['keyword_score'] = keyword_by_id[article_id]['score']
+                matches.append(match)
             
-            return results
+            self.logger.info(f"混合檢索: 詞向量 {len(vector_matches)} 篇、關鍵字 {len(keyword_by_id)} 篇，"
+                             f"兩者皆命中 {len(vector_by_id.keys() & keyword_by_id.keys())} 篇")
+            return self.fetch_ranked_articles(matches)
             
         except Exception as e:
-            self.logger.error(f"搜尋相關文章失敗: {e}")
+            self.logger.error(f"混合檢索失敗: {e}")
+            return []
+    
+    def rank_query_by_vector(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        query_vector = self.vector_processor.compute_title_vector(query)
+        if not query_vector:
+            self.logger.warning("無法計算查詢詞向量")
             return []
+        return self.rank_by_vector(query_vector, top_k)
+    
+    def rank_by_vector(self, query_vector: List[float], top_k: int = 10,
+                       candidate_factor: int = 10) -> List[Dict[str, Any]]:
+        # 只查詢常駐索引，回傳依相似度排序的 [{'id', 'similarity', 'rows'(片段id，以片段檢索時)}]
+        # 整篇文章以融合向量（標題權重0.3，內容權重0.7）檢索；有片段索引時另以片段檢索並依文章分組，
+        # 兩者以 chunk_weight 加權合併，標題主導的短文不會只因片段相似度低而排在後面
+        article_matches = []
+        if self.article_index is not None and self.article_index.ntotal:
+            if self.article_index.dim == len(query_vector):
+                article_ids, scores = self.article_index.search(query_vector, top_k * candidate_factor)
+                article_matches = [{'id': int(article_id), 'similarity': float(score)}
+                                   for article_id, score in zip(article_ids, scores)]
+            else:
+                self.logger.warning(f"查詢詞向量維度 {len(query_vector)} 與已儲存的詞向量維度 {self.article_index.dim} 不符")
+        
+        if self.use_chunks and self.chunk_index is not None and self.chunk_index.ntotal:
+            if self.chunk_index.dim == len(query_vector):
+                chunk_ids, scores = self.chunk_index.search(query_vector, top_k * self.max_chunks_per_article * candidate_factor)
+                chunk_matches = self.vector_processor.group_chunk_matches(
+                    chunk_ids.tolist(), scores, self.chunk_article_ids, top_k * candidate_factor, self.max_chunks_per_article
+                )
+                return self.fuse_chunk_matches(chunk_matches, article_matches, top_k)
+        
+        return article_matches[:top_k]
+    
+    def fuse_chunk_matches(self, chunk_matches: List[Dict[str, Any]], article_matches: List[Dict[str, Any]],
+                           top_k: int = 10) -> List[Dict[str, Any]]:
+        # 綜合相似度 = chunk_weight * 最相關片段相似度 + (1 - chunk_weight) * 整篇文章相似度
+        # 只出現在其中一份候選的文章，另一項以該份候選的最低分估計（真實分數不會更高）
+        if not article_matches or not chunk_matches:
+            return (chunk_matches or article_matches)[:top_k]
+        
+        article_scores = {match['id']: match['similarity'] for match in article_matches}
+        chunk_floor = min(match['similarity'] for match in chunk_matches)
+        article_floor = min(article_scores.values())
+        
+        matches = {match['id']: dict(match) for match in chunk_matches}
+        for article_id in article_scores:
+            matches.setdefault(article_id, {'id': article_id, 'similarity': chunk_floor, 'rows': [], 'chunk_similarities': []})
+        
+        for match in matches.values():
+            match['chunk_similarity'] = match['similarity']
+            match['article_similarity'] = article_scores.get(match['id'], article_floor)
+            match['similarity'] = (self.chunk_weight * match['chunk_similarity']
+                                   + (1 - self.chunk_weight) * match['article_similarity'])
+        
+        return sorted(matches.values(), key=lambda match: match['similarity'], reverse=True)[:top_k]
+    
+    def fetch_ranked_articles(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # 依排序取回文章：片段檢索的結果只附上最相關的片段，其餘以一次查詢取回完整文章
+        chunks = self.db_manager.get_chunks_by_ids([chunk_id for match in matches for chunk_id in match.get('rows', [])])
+        articles = {
+            article['id']: article
+            for article in self.db_manager.get_articles_by_ids([match['id'] for match in matches if not match.get('rows')])
+        }
+        
+        results = []
+        for match in matches:
+            if match.get('rows'):
+                # 片段依在原文中的位置排列，閱讀順序較自然
+                spans = sorted(
+                    (chunks[chunk_id] for chunk_id in match['rows'] if chunk_id in chunks),
+                    key=lambda chunk: chunk['start']
+                )
+                if not spans:
+                    continue
+                result = {
+                    'id': match['id'],
+                    'title': spans[0]['title'],
+                    'author': spans[0]['author'],
+                    'date': spans[0]['date'],
+                    'url': spans[0]['url'],
+                    'content': "\n".join(chunk['text'] for chunk in spans),
+                    'chunks': spans
+                }
+            elif match['id'] in articles:
+                result = articles[match['id']]
+            else:
+                continue
+            
+            for key in ('similarity', 'keyword_score', 'fusion_score'):
+                if key in match:
+                    result[key] = match[key]
+            results.append(result)
+        
+        return results
     
     def generate_context(self, relevant_articles: List[Dict[str, Any]]) -> str:
         if not relevant_articles:
@@ -128,12 +402,20 @@ class RAGSystem:
         context_parts.append("根據以下PTT八卦版文章資訊回答問題（不包含板規/置底/公告）：\n")
         
         for i, article in enumerate(filtered_articles, 1):
-            similarity = article.get('similarity', 0)
-            context_parts.append(f"文章{i} (相似度: {similarity:.3f}):")
+            if 'fusion_score' in article:
+                context_parts.append(f"文章{i} (混合檢索分數: {article['fusion_score']:.4f}):")
+            else:
+                similarity = article.get('similarity', 0)
+                context_parts.append(f"文章{i} (相似度: {similarity:.3f}):")
             context_parts.append(f"標題: {article['title']}")
             context_parts.append(f"作者: {article['author']}")
             context_parts.append(f"時間: {article['date']}")
-            context_parts.append(f"內容: {article['content'][:500]}...")  # 限制內容長度
+            if article.get('chunks'):
+                # 只放入與問題最相關的內文片段
+                for chunk in article['chunks']:
+                    context_parts.append(f"內容片段: {chunk['text']}")
+            else:
+                context_parts.append(f"內容: {article['content'][:500]}...")  # 限制內容長度
             context_parts.append("")
         
         return "\n".join(context_parts)
@@ -193,7 +475,9 @@ class RAGSystem:
                 'database': db_stats,
                 'model_info': {
                     'taide_model': self.taide_model_path,
-                    'vector_model': self.vector_model_name
+                    'vector_model': self.vector_model_name,
+                    'embedding_backend': self.embedding_backend,
+                    'retrieval_mode': self.retrieval_mode
                 }
             }
         except Exception as e:
@@ -234,6 +518,8 @@ class RAGSystem:
                 print("-" * 50)
     
     def close(self):
+        if self.retrieval_executor:
+            self.retrieval_executor.shutdown()
         if self.db_manager:
             self.db_manager.close()
         self.logger.info("RAG系統已關閉")
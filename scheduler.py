@@ -17,11 +17,15 @@ class PTTScheduler:
     def __init__(self, 
                  db_path: str = "ptt_articles.db",
                  pages_to_crawl: int = 30,
-                 vector_model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+                 vector_model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 embedding_backend: str = "torch",
+                 pca_path: Optional[str] = None):
 
         self.db_path = db_path#db_path: 資料庫路徑
         self.pages_to_crawl = pages_to_crawl  #每次爬取的頁數
         self.vector_model_name = vector_model_name #詞向量模型名稱
+        self.embedding_backend = embedding_backend #詞向量後端，torch 或 onnx
+        self.pca_path = pca_path #PCA降維參數檔，None 表示不降維
         
         self.crawler = None
         self.db_manager = None
@@ -61,7 +65,10 @@ class PTTScheduler:
             self.logger.info("資料庫管理器初始化完成")
             
             # 初始化詞向量處理器
-            self.vector_processor = VectorProcessor(self.vector_model_name)
+            self.vector_processor = VectorProcessor(self.vector_model_name, backend=self.embedding_backend,
+                                                    reducer_path=self.pca_path)
+            # 新詞向量須與已儲存的詞向量以同一組PCA參數降維
+            self.db_manager.check_vector_reduction(self.vector_processor.reducer)
             self.logger.info("詞向量處理器初始化完成")
             
         except Exception as e:
@@ -73,24 +80,24 @@ class PTTScheduler:
             self.logger.info("開始執行每日爬取任務")
             start_time = datetime.now()
             
-            # 1. 爬取PTT文章
+            # 1. 爬取PTT文章 2. 寫入資料庫（邊爬邊分批寫入）
             self.logger.info(f"開始爬取PTT八卦版前{self.pages_to_crawl}頁文章")
-            articles = self.crawler.crawl_daily_articles(pages=self.pages_to_crawl)
+            articles = self.crawler.iter_daily_articles(
+                pages=self.pages_to_crawl,
+                known_urls_lookup=self.db_manager.get_existing_urls
+            )
+            inserted_count = self.db_manager.insert_articles_stream(articles)
             
-            if not articles:
-                self.logger.warning("未爬取到任何文章")
-                return
-            
-            self.logger.info(f"成功爬取 {len(articles)} 篇文章")
-            
-            # 2. 寫入資料庫
-            self.logger.info("開始寫入資料庫...")
-            inserted_count = self.db_manager.insert_articles(articles)
-            self.logger.info(f"成功寫入 {inserted_count} 篇新文章到資料庫")
+            # 增量爬取下沒有新文章屬正常情況，仍繼續補算詞向量
+            if inserted_count:
+                self.logger.info(f"成功寫入 {inserted_count} 篇新文章到資料庫")
+            else:
+                self.logger.info("沒有新文章需要寫入")
             
             # 3. 計算詞向量
             self.logger.info("開始計算詞向量...")
-            articles_without_vectors = self.db_manager.get_articles_without_vectors()
+            self.db_manager.normalize_legacy_vectors()
+            articles_without_vectors = self.db_manager.get_articles_without_vectors(self.vector_model_name)
             
             if articles_without_vectors:
                 self.logger.info(f"需要計算詞向量的文章數: {len(articles_without_vectors)}")
@@ -98,13 +105,12 @@ class PTTScheduler:
                 # 批次計算詞向量
                 vector_results = self.vector_processor.batch_compute_vectors(articles_without_vectors)
                 
-                # 更新資料庫中的詞向量
-                for result in vector_results:
-                    self.db_manager.update_vectors(
-                        result['id'],
-                        result['title_vector'],
-                        result['content_vector']
-                    )
+                # 更新資料庫中的詞向量（含內文片段詞向量）
+                self.db_manager.update_vectors_batch(
+                    vector_results,
+                    normalized=self.vector_processor.normalize_embeddings,
+                    model_name=self.vector_model_name
+                )
                 
                 self.logger.info(f"成功計算並更新 {len(vector_results)} 篇文章的詞向量")
             else:
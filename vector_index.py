@@ -0,0 +1,204 @@
+import logging
+from typing import Iterable, Tuple, Optional
+import numpy as np
+import faiss
+
+# flat: 精確內積搜尋；hnsw: 圖索引，查詢快但不支援刪除（以標記取代）；ivfpq: 分群加乘積量化，記憶體最小，需先訓練
+# ivfpq 在向量數足以訓練前先存放於精確索引，達到門檻後訓練並搬入
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+def default_pq_m(dim: int) -> int:
+    # 每個向量的PQ編碼位元組數（pq_nbits=8 時），需整除維度；預設約為 dim/8
+    return next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+
+class VectorIndex:
+    def __init__(self, dim: int, index_type: str = "flat",
+                 hnsw_m: int = 32,
+                 ef_construction: int = 200,
+                 ef_search: int = 64,
+                 nlist: Optional[int] = None,
+                 nprobe: int = 16,
+                 pq_m: Optional[int] = None,
+                 pq_nbits: int = 8):
+        
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"不支援的索引類型: {index_type}，可用: {', '.join(INDEX_TYPES)}")
+        
+        self.dim = dim #dim: 詞向量維度
+        self.index_type = index_type #index_type: 索引類型，flat、hnsw 或 ivfpq
+        self.hnsw_m = hnsw_m #hnsw_m: HNSW每個節點的鄰居數，越大recall越高、記憶體越大
+        self.ef_construction = ef_construction #ef_construction: HNSW建圖時的候選數
+        self.ef_search = ef_search #ef_search: HNSW查詢時的候選數，越大recall越高、查詢越慢
+        self.nlist = nlist #nlist: IVF分群數，None 表示訓練時依資料量決定（約 4*sqrt(n)）
+        self.nprobe = nprobe #nprobe: IVF查詢時搜尋的分群數
+        self.pq_m = pq_m or default_pq_m(dim) #pq_m: PQ子向量數，即每個向量的編碼位元組數
+        self.pq_nbits = pq_nbits #pq_nbits: 每個子向量的編碼位元數
+        
+        self.index = None
+        self.quantizer = None
+        self.trained = index_type != "ivfpq" #trained: IVF-PQ是否已訓練；未訓練前 index 為暫存向量的精確索引
+        # HNSW 不支援刪除：記錄每個位置對應的id與每個id最新的位置，舊位置於查詢時以 IDSelector 排除
+        self.labels = []
+        self.latest_positions = {}
+        self._stale_selector = None
+        
+        self.setup_logging()
+        self.create_index()
+    
+    def setup_logging(self):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger(__name__)
+    
+    def create_index(self, training_matrix: Optional[np.ndarray] = None):
+        if self.index_type == "hnsw":
+            self.index = faiss.IndexHNSWFlat(self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = self.ef_construction
+            self.index.hnsw.efSearch = self.ef_search
+        elif self.index_type == "ivfpq" and training_matrix is not None:
+            nlist = self.nlist or max(1, min(int(4 * np.sqrt(len(training_matrix))), len(training_matrix) // 39))
+            self.quantizer = faiss.IndexFlatIP(self.dim)
+            ivfpq = faiss.IndexIVFPQ(self.quantizer, self.dim, nlist, self.pq_m, self.pq_nbits, faiss.METRIC_INNER_PRODUCT)
+            ivfpq.train(training_matrix)
+            ivfpq.nprobe = self.nprobe
+            # IVF 本身以id儲存向量並支援刪除，不需 IndexIDMap2
+            self.index = ivfpq
+            self.nlist = nlist
+            self.trained = True
+            self.logger.info(f"IVF-PQ索引訓練完成: {len(training_matrix)} 個向量，{nlist} 個分群，"
+                             f"每個向量 {self.pq_m * self.pq_nbits // 8} 位元組")
+        else:
+            # 內積索引，以 IndexIDMap2 將索引內的向量對應回資料庫中的id（文章id或片段id）
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+    
+    @property
+    def min_training_size(self) -> int:
+        # faiss建議每個中心至少39個訓練向量，PQ每個子向量有 2**pq_nbits 個中心
+        return 39 * max(2 ** self.pq_nbits, self.nlist or 1)
+    
+    @property
+    def ntotal(self) -> int:
+        if self.index is None:
+            return 0
+        if self.index_type == "hnsw":
+            return len(self.latest_positions)
+        return self.index.ntotal
+    
+    @property
+    def memory_bytes(self) -> int:
+        # 索引序列化後的大小，近似常駐記憶體用量
+        if self.index is None:
+            return 0
+        return faiss.serialize_index(self.index).nbytes
+    
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+        if ef_search is not None:
+            self.ef_search = ef_search
+            if self.index_type == "hnsw" and self.index is not None:
+                self.index.hnsw.efSearch = ef_search
+        if nprobe is not None:
+            self.nprobe = nprobe
+            if self.index_type == "ivfpq" and self.trained:
+                self.index.nprobe = nprobe
+    
+    def add(self, ids: Iterable[int], matrix: np.ndarray) -> int:
+        # 新增向量；已在索引中的id先移除，重新計算詞向量的文章以新向量取代
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if not len(ids):
+            return 0
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"詞向量維度 {matrix.shape[1]} 與索引維度 {self.dim} 不符")
+        
+        self.remove(ids)
+        if not self.trained:
+            # IVF-PQ 未訓練前先存入精確索引，累積到足以訓練的數量後一次訓練並搬入
+            self.index.add_with_ids(matrix, ids)
+            if self.index.ntotal >= self.min_training_size:
+                self.train_buffered()
+        elif self.index_type == "hnsw":
+            start = len(self.labels)
+            self.index.add(matrix)
+            self.labels.extend(ids.tolist())
+            self.latest_positions.update((article_id, start + offset) for offset, article_id in enumerate(ids.tolist()))
+            self._stale_selector = None
+            self.compact_if_needed()
+        else:
+            self.index.add_with_ids(matrix, ids)
+        return len(ids)
+    
+    def train_buffered(self):
+        # 以暫存的所有向量訓練IVF-PQ，再以原本的id加入
+        buffered_ids = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        self.create_index(vectors)
+        self.index.add_with_ids(vectors, buffered_ids)
+    
+    def compact_if_needed(self):
+        # 被取代或刪除的舊位置超過有效向量的5%（至少100個）時重建；舊位置仍佔用圖的走訪與記憶體
+        if len(self.labels) - len(self.latest_positions) > max(100, len(self.latest_positions) // 20):
+            self.compact()
+    
+    def compact(self):
+        # HNSW 被取代的舊位置過多時，以仍有效的向量重建索引，避免查詢時多取的數量持續增加
+        live = sorted(self.latest_positions.items(), key=lambda item: item[1])
+        vectors = self.index.storage.reconstruct_n(0, self.index.ntotal)
+        rows = [position for _, position in live]
+        
+        self.create_index()
+        if rows:
+            self.index.add(np.ascontiguousarray(vectors[rows]))
+        self.labels = [article_id for article_id, _ in live]
+        self.latest_positions = {article_id: position for position, article_id in enumerate(self.labels)}
+        self._stale_selector = None
+        self.logger.info(f"HNSW索引已重建，保留 {len(self.labels)} 個向量")
+    
+    def remove(self, ids: Iterable[int]) -> int:
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if not len(ids) or not self.ntotal:
+            return 0
+        if self.index_type == "hnsw":
+            removed = sum(self.latest_positions.pop(article_id, None) is not None for article_id in ids.tolist())
+            self._stale_selector = None
+            self.compact_if_needed()
+            return removed
+        return self.index.remove_ids(ids)
+    
+    def search_params(self):
+        # 排除舊位置的HNSW查詢參數，索引變動後才重建；沒有舊位置時不需過濾
+        stale = len(self.labels) - len(self.latest_positions)
+        if not stale:
+            return faiss.SearchParametersHNSW(efSearch=self.ef_search)
+        if self._stale_selector is None:
+            live = np.zeros(len(self.labels), dtype=bool)
+            live[list(self.latest_positions.values())] = True
+            stale_positions = np.flatnonzero(~live).astype(np.int64)
+            batch = faiss.IDSelectorBatch(len(stale_positions), faiss.swig_ptr(stale_positions))
+            # 保留 batch 的參照，IDSelectorNot 不持有其生命週期
+            self._stale_selector = (batch, faiss.IDSelectorNot(batch))
+        return faiss.SearchParametersHNSW(sel=self._stale_selector[1], efSearch=self.ef_search)
+    
+    def search(self, query_vector, top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        # 回傳 (id, 內積相似度)，依相似度由高到低排序；查詢向量先正規化
+        query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        
+        k = min(top_k, self.ntotal)
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        
+        if self.index_type == "hnsw":
+            # 舊位置在圖走訪時即被排除，不需依舊位置數量多取，查詢延遲不隨刪除數增加
+            scores, positions = self.index.search(query, k, params=self.search_params())
+            results = [
+                (self.labels[position], score)
+                for position, score in zip(positions[0].tolist(), scores[0].tolist())
+                if position >= 0 and self.latest_positions.get(self.labels[position]) == position
+            ][:k]
+            return (np.array([article_id for article_id, _ in results], dtype=np.int64),
+                    np.array([score for _, score in results], dtype=np.float32))
+        
+        scores, ids = self.index.search(query, k)
+        valid = ids[0] >= 0
+        return ids[0][valid], scores[0][valid]
@@ -1,15 +1,48 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 import json
+from embedding_cache import EmbeddingCache
+from embedding_backend import create_embedding_backend
+from vector_reducer import PCAReducer
 
 class VectorProcessor:
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 batch_size: int = 64,
+                 articles_per_chunk: int = 1000,
+                 cache_path: Optional[str] = None,
+                 normalize_embeddings: bool = True,
+                 backend: str = "torch",
+                 onnx_model_dir: str = "onnx_models",
+                 num_threads: Optional[int] = None,
+                 chunk_size: int = 150,
+                 reducer_path: Optional[str] = None,
+                 cache_read_only: bool = False):
         self.model_name = model_name
+        self.backend = backend #backend: 詞向量後端，torch 或 onnx（int8量化，僅CPU）
+        self.onnx_model_dir = onnx_model_dir #onnx_model_dir: ONNX後端匯出模型的存放目錄
+        self.num_threads = num_threads #num_threads: 模型推論執行緒數，None 表示使用預設值
+        self.batch_size = batch_size #batch_size: 每次送進模型的文字數
+        self.articles_per_chunk = articles_per_chunk #articles_per_chunk: 批次計算時每輪處理的文章數，限制記憶體用量
+        self.normalize_embeddings = normalize_embeddings #normalize_embeddings: 文章詞向量輸出為L2正規化的float32，相似度只需內積
+        self.chunk_size = chunk_size #chunk_size: 內文片段的最大字數，每個片段各自計算詞向量供片段檢索
         self.model = None
         self.setup_logging()
         self.load_model()
+        
+        # 選用的PCA降維（reducer_path 為 .npz 參數檔），寫入與查詢時都套用同一組參數
+        self.reducer = None
+        if reducer_path:
+            self.reducer = PCAReducer(reducer_path)
+            if not self.reducer.is_fitted:
+                self.logger.warning(f"找不到PCA參數檔，不進行降維: {reducer_path}")
+                self.reducer = None
+        
+        # 句子層級的詞向量快取（cache_path 為 SQLite 檔案路徑），重複出現的簽名檔、轉錄內容只需編碼一次
+        # 量化模型的輸出與原模型略有差異，快取鍵需區分後端
+        cache_model_name = model_name if backend == "torch" else f"{model_name}#{backend}"
+        # cache_read_only 時只讀取快取，新的詞向量由呼叫端取出後寫入（平行計算時由父行程統一寫入）
+        self.embedding_cache = EmbeddingCache(cache_path, cache_model_name, read_only=cache_read_only) if cache_path else None
     
     def setup_logging(self):
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,33 +50,76 @@ class VectorProcessor:
     
     def load_model(self):
         try:
-            self.logger.info(f"正在載入詞向量模型: {self.model_name}")
-            self.model = SentenceTransformer(self.model_name)
+            self.logger.info(f"正在載入詞向量模型: {self.model_name} (後端: {self.backend})")
+            self.model = create_embedding_backend(self.backend, self.model_name,
+                                                  model_dir=self.onnx_model_dir,
+                                                  num_threads=self.num_threads)
             self.logger.info("詞向量模型載入完成")
         except Exception as e:
             self.logger.error(f"載入詞向量模型失敗: {e}")
             raise
     
-    def compute_vectors(self, texts: List[str]) -> np.ndarray:
+    def compute_vectors(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
         if not texts:
             return np.array([])
         
+        if self.embedding_cache:
+            return self.compute_vectors_with_cache(texts, batch_size)
+        
+        return self.encode_texts(texts, batch_size)
+    
+    def compute_vectors_with_cache(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        cached = self.embedding_cache.get_many(texts)
+        
+        # 只編碼快取中沒有的文字（同一批內重複的文字只編碼一次）
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            encoded = dict(zip(missing, self.encode_texts(missing, batch_size)))
+            self.embedding_cache.put_many(missing, [encoded[text] for text in missing])
+            cached = [vector if vector is not None else encoded[text] for text, vector in zip(texts, cached)]
+        
+        self.logger.info(f"詞向量快取: 本次 {len(texts)} 個文字中 {len(texts) - len(missing)} 個命中，累計 {self.embedding_cache.get_statistics()}")
+        return np.vstack(cached)
+    
+    def encode_texts(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
         try:
-            # 使用模型計算詞向量
-            embeddings = self.model.encode(texts, convert_to_numpy=True)
+            # 依長度排序後分批編碼，同一批次的文字長度相近可減少padding，完成後還原原本順序
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+            sorted_embeddings = self.model.encode(
+                [texts[i] for i in order],
+                batch_size=batch_size or self.batch_size,
+                convert_to_numpy=True
+            )
+            embeddings = np.empty_like(sorted_embeddings)
+            embeddings[order] = sorted_embeddings
             self.logger.info(f"成功計算 {len(texts)} 個文字的詞向量")
             return embeddings
         except Exception as e:
             self.logger.error(f"計算詞向量失敗: {e}")
             raise
     
+    def get_cache_statistics(self) -> Dict[str, Any]:
+        return self.embedding_cache.get_statistics() if self.embedding_cache else {}
+    
+    def finalize_vector(self, vector: np.ndarray) -> List[float]:
+        # 文章詞向量的最終形式：float32，啟用正規化時縮放為單位長度，有PCA參數時再降維（降維後一律正規化）
+        # 句子詞向量（含快取）維持模型原始輸出，內容向量先平均再正規化
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.normalize_embeddings:
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+        if self.reducer:
+            vector = self.reducer.transform(vector)
+        return vector.tolist()
+    
     def compute_title_vector(self, title: str) -> List[float]:
         if not title or not title.strip():
             return []
         
         try:
             vector = self.compute_vectors([title])
-            return vector[0].tolist()
+            return self.finalize_vector(vector[0])
         except Exception as e:
             self.logger.error(f"計算標題詞向量失敗: {title}, 錯誤: {e}")
             return []
@@ -53,31 +129,29 @@ class VectorProcessor:
             return []
         
         try:
-            # 如果內容太長，可以分段處理
-            max_length = 512  # 模型的最大輸入長度
-            if len(content) > max_length:
-                # 簡單的分段策略：按句子分割
-                sentences = self.split_content(content)
-                vectors = []
-                for sentence in sentences:
-                    if len(sentence.strip()) > 10:  # 過濾太短的句子
-                        vector = self.compute_vectors([sentence])
-                        vectors.append(vector[0])
-                
-                if vectors:
-                    # 取平均向量
-                    avg_vector = np.mean(vectors, axis=0)
-                    return avg_vector.tolist()
-                else:
-                    return []
-            else:
-                vector = self.compute_vectors([content])
-                return vector[0].tolist()
+            segments = self.get_content_segments(content)
+            if not segments:
+                return []
+            
+            # 多個句子時取平均向量
+            vectors = self.compute_vectors(segments)
+            return self.finalize_vector(np.mean(vectors, axis=0))
                 
         except Exception as e:
             self.logger.error(f"計算內容詞向量失敗: {content[:50]}..., 錯誤: {e}")
             return []
     
+    def get_content_segments(self, content: str) -> List[str]:
+        # 內容向量要編碼的文字片段：短內容整段編碼，長內容按句子分割並過濾太短的句子
+        if not content or not content.strip():
+            return []
+        
+        max_length = 512  # 模型的最大輸入長度
+        if len(content) <= max_length:
+            return [content]
+        
+        return [sentence for sentence in self.split_content(content) if len(sentence.strip()) > 10]
+    
     def split_content(self, content: str) -> List[str]:
         # 簡單的分句策略
         import re
@@ -90,19 +164,74 @@ class VectorProcessor:
         
         return sentences
     
+    def split_content_chunks(self, content: str) -> List[Tuple[int, int]]:
+        # 依句子邊界將內文切成不超過 chunk_size 字的片段，回傳每個片段在內文中的 (起, 迄) 位置
+        # 單句超過 chunk_size 時直接依字數切開
+        if not content or not content.strip():
+            return []
+        
+        import re
+        
+        spans = []
+        for match in re.finditer(r'[^。！？\n]+[。！？\n]*', content):
+            start, end = match.span()
+            while end - start > self.chunk_size:
+                spans.append((start, start + self.chunk_size))
+                start += self.chunk_size
+            spans.append((start, end))
+        
+        chunks = []
+        chunk_start, chunk_end = None, None
+        for start, end in spans:
+            if chunk_start is not None and end - chunk_start > self.chunk_size:
+                chunks.append((chunk_start, chunk_end))
+                chunk_start = None
+            if chunk_start is None:
+                chunk_start = start
+            chunk_end = end
+        if chunk_start is not None:
+            chunks.append((chunk_start, chunk_end))
+        
+        # 去除片段頭尾空白並略過空白片段
+        trimmed = []
+        for start, end in chunks:
+            text = content[start:end]
+            if not text.strip():
+                continue
+            start += len(text) - len(text.lstrip())
+            end -= len(text) - len(text.rstrip())
+            trimmed.append((start, end))
+        
+        return trimmed
+    
+    def compute_content_chunks(self, content: str) -> List[Dict[str, Any]]:
+        chunks = self.split_content_chunks(content)
+        if not chunks:
+            return []
+        
+        vectors = self.compute_vectors([content[start:end] for start, end in chunks])
+        return [
+            {'chunk_index': i, 'start': start, 'end': end, 'vector': self.finalize_vector(vector)}
+            for i, ((start, end), vector) in enumerate(zip(chunks, vectors))
+        ]
+    
     def compute_article_vectors(self, title: str, content: str) -> Tuple[List[float], List[float]]:
         title_vector = self.compute_title_vector(title)
         content_vector = self.compute_content_vector(content)
         
         return title_vector, content_vector
     
-    def compute_similarity(self, vector1: List[float], vector2: List[float]) -> float:
+    def compute_similarity(self, vector1: List[float], vector2: List[float], normalized: bool = False) -> float:
         if not vector1 or not vector2:
             return 0.0
         
         try:
-            v1 = np.array(vector1)
-            v2 = np.array(vector2)
+            v1 = np.array(vector1, dtype=np.float32)
+            v2 = np.array(vector2, dtype=np.float32)
+            
+            # 兩個向量皆已正規化時餘弦相似度即為內積
+            if normalized:
+                return float(np.dot(v1, v2))
             
             # 計算餘弦相似度
             cosine_sim = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
@@ -111,46 +240,132 @@ class VectorProcessor:
             self.logger.error(f"計算相似度失敗: {e}")
             return 0.0
     
-    def find_similar_articles(self, query_vector: List[float], article_vectors: List[Dict], top_k: int = 10) -> List[Dict]:
-        if not query_vector or not article_vectors:
-            return []
+    @staticmethod
+    def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        # 就地將每一列正規化為單位長度，全零列保持為零
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
+    
+    @staticmethod
+    def fuse_vectors(title_matrix: np.ndarray, content_matrix: np.ndarray,
+                     title_weight: float = 0.3, content_weight: float = 0.7) -> np.ndarray:
+        # 標題與內容向量皆已正規化時，查詢與融合向量的內積即為 search_vector_matrix 的綜合相似度，只需一次搜尋
+        return (title_weight * np.asarray(title_matrix, dtype=np.float32)
+                + content_weight * np.asarray(content_matrix, dtype=np.float32))
+    
+    @staticmethod
+    def search_vector_matrix(query_vector, title_matrix: np.ndarray, content_matrix: np.ndarray, top_k: int = 10,
+                             title_weight: float = 0.3, content_weight: float = 0.7):
+        # 以矩陣運算一次算出所有文章的綜合相似度，矩陣的每一列需已正規化
+        # 回傳 (列索引, 綜合相似度, 標題相似度, 內容相似度)，依綜合相似度由高到低排序
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
         
-        similarities = []
+        title_scores = title_matrix @ query
+        content_scores = content_matrix @ query
+        scores = title_weight * title_scores + content_weight * content_scores
         
-        for article in article_vectors:
-            title_sim = self.compute_similarity(query_vector, article.get('title_vector', []))
-            content_sim = self.compute_similarity(query_vector, article.get('content_vector', []))
-            
-            # 綜合相似度（標題權重0.3，內容權重0.7）
-            combined_sim = 0.3 * title_sim + 0.7 * content_sim
+        k = min(top_k, len(scores))
+        if k <= 0:
+            empty = np.array([], dtype=np.float32)
+            return np.array([], dtype=np.int64), empty, empty, empty
+        
+        # argpartition 只需 O(n) 找出前k名，再對這k筆排序
+        if k < len(scores):
+            indices = np.argpartition(-scores, k - 1)[:k]
+        else:
+            indices = np.arange(len(scores))
+        indices = indices[np.argsort(-scores[indices], kind='stable')]
+        
+        return indices, scores[indices], title_scores[indices], content_scores[indices]
+    
+    @staticmethod
+    def group_chunk_matches(rows, scores, chunk_article_ids, top_k: int = 10,
+                            max_chunks_per_article: int = 2) -> List[Dict[str, Any]]:
+        # rows/scores 為依相似度由高到低排序的候選片段；chunk_article_ids[row] 為片段所屬文章
+        grouped = {}
+        for row, score in zip(rows, scores):
+            article_id = chunk_article_ids[row]
+            if article_id not in grouped:
+                if len(grouped) >= top_k:
+                    continue
+                grouped[article_id] = {'id': article_id, 'similarity': float(score), 'rows': [], 'chunk_similarities': []}
+            if len(grouped[article_id]['rows']) < max_chunks_per_article:
+                grouped[article_id]['rows'].append(int(row))
+                grouped[article_id]['chunk_similarities'].append(float(score))
+        
+        return list(grouped.values())
+    
+    def batch_compute_vectors(self, articles: List[Dict[str, Any]], batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = []
+        
+        for start in range(0, len(articles), self.articles_per_chunk):
+            chunk = articles[start:start + self.articles_per_chunk]
+            self.logger.info(f"正在處理第 {start + 1}-{start + len(chunk)}/{len(articles)} 篇文章")
             
-            similarities.append({
-                'id': article['id'],
-                'title': article.get('title', ''),
-                'similarity': combined_sim,
-                'title_similarity': title_sim,
-                'content_similarity': content_sim
-            })
+            try:
+                results.extend(self.compute_chunk_vectors(chunk, batch_size))
+            except Exception as e:
+                # 整批失敗時退回逐篇計算，避免單篇異常拖累整批
+                self.logger.error(f"批次計算詞向量失敗，改為逐篇計算: {e}")
+                results.extend(self.compute_vectors_one_by_one(chunk))
+        
+        return results
+    
+    def compute_chunk_vectors(self, articles: List[Dict[str, Any]], batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        # 收集整批文章的標題與內容句子（重複文字只編碼一次），一起分批編碼後再分配回各篇文章
+        texts = []
+        text_index = {}
+        
+        def add_text(text):
+            if text not in text_index:
+                text_index[text] = len(texts)
+                texts.append(text)
+            return text_index[text]
         
-        # 按相似度排序
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
+        plans = []
+        for article in articles:
+            title = article.get('title', '') or ''
+            content = article.get('content', '') or ''
+            title_idx = add_text(title) if title.strip() else None
+            content_idxs = [add_text(segment) for segment in self.get_content_segments(content)]
+            chunk_idxs = [(start, end, add_text(content[start:end])) for start, end in self.split_content_chunks(content)]
+            plans.append((article['id'], title_idx, content_idxs, chunk_idxs))
         
-        return similarities[:top_k]
+        embeddings = self.compute_vectors(texts, batch_size)
+        
+        results = []
+        for article_id, title_idx, content_idxs, chunk_idxs in plans:
+            results.append({
+                'id': article_id,
+                'title_vector': self.finalize_vector(embeddings[title_idx]) if title_idx is not None else [],
+                'content_vector': self.finalize_vector(embeddings[content_idxs].mean(axis=0)) if content_idxs else [],
+                'chunks': [
+                    {'chunk_index': i, 'start': start, 'end': end, 'vector': self.finalize_vector(embeddings[text_idx])}
+                    for i, (start, end, text_idx) in enumerate(chunk_idxs)
+                ]
+            })
+        
+        return results
     
-    def batch_compute_vectors(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def compute_vectors_one_by_one(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         results = []
         
-        for i, article in enumerate(articles):
+        for article in articles:
             try:
-                self.logger.info(f"正在處理第 {i+1}/{len(articles)} 篇文章")
-                
                 title_vector = self.compute_title_vector(article.get('title', ''))
                 content_vector = self.compute_content_vector(article.get('content', ''))
+                chunks = self.compute_content_chunks(article.get('content', '') or '')
                 
                 results.append({
                     'id': article['id'],
                     'title_vector': title_vector,
-                    'content_vector': content_vector
+                    'content_vector': content_vector,
+                    'chunks': chunks
                 })
                 
             except Exception as e:
@@ -175,5 +390,5 @@ if __name__ == "__main__":
     print(f"內容詞向量前5個值: {content_vector[:5]}")
     
     # 測試相似度計算
-    similarity = processor.compute_similarity(title_vector, content_vector)
+    similarity = processor.compute_similarity(title_vector, content_vector, normalized=processor.normalize_embeddings)
     print(f"標題與內容相似度: {similarity:.4f}") 
@@ -0,0 +1,91 @@
+import os
+import zlib
+import logging
+from typing import Optional
+import numpy as np
+
+class PCAReducer:
+    def __init__(self, path: Optional[str] = "pca_reducer.npz"):
+        
+        self.path = path #path: 降維參數檔（.npz），包含平均向量與主成分；None 表示只在記憶體中使用
+        self.mean = None
+        self.components = None
+        self.explained_variance_ratio = 0.0
+        
+        self.setup_logging()
+        if self.path and os.path.exists(self.path):
+            self.load()
+    
+    def setup_logging(self):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def is_fitted(self) -> bool:
+        return self.components is not None
+    
+    @property
+    def fingerprint(self) -> str:
+        # 參數內容的CRC32，參數檔搬移或改名後仍能辨識是否為同一組參數
+        if not self.is_fitted:
+            return ""
+        return f"{zlib.crc32(self.mean.tobytes() + self.components.tobytes()):08x}"
+    
+    @property
+    def input_dim(self) -> int:
+        return self.components.shape[1] if self.is_fitted else 0
+    
+    @property
+    def output_dim(self) -> int:
+        return self.components.shape[0] if self.is_fitted else 0
+    
+    def fit(self, matrix: np.ndarray, n_components: int, max_samples: Optional[int] = 200000, seed: int = 0):
+        # 以語料的詞向量擬合PCA，只需共變異矩陣（維度×維度）的特徵分解，百萬筆語料時先抽樣
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if n_components <= 0 or n_components > matrix.shape[1]:
+            raise ValueError(f"降維後維度需介於 1 到 {matrix.shape[1]}: {n_components}")
+        
+        if max_samples and len(matrix) > max_samples:
+            rows = np.random.default_rng(seed).choice(len(matrix), size=max_samples, replace=False)
+            matrix = matrix[rows]
+        
+        mean = matrix.mean(axis=0)
+        centered = (matrix - mean).astype(np.float64)
+        covariance = centered.T @ centered / max(1, len(centered) - 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1]
+        
+        self.mean = mean.astype(np.float32)
+        self.components = eigenvectors[:, order[:n_components]].T.astype(np.float32)
+        self.explained_variance_ratio = float(eigenvalues[order[:n_components]].sum() / max(eigenvalues.sum(), 1e-12))
+        self.logger.info(f"PCA擬合完成: {self.input_dim} -> {self.output_dim} 維，保留變異量 {self.explained_variance_ratio:.1%}")
+        return self
+    
+    def transform(self, matrix: np.ndarray) -> np.ndarray:
+        # 投影到主成分後重新正規化，降維後的向量仍可直接以內積計算相似度
+        matrix = np.asarray(matrix, dtype=np.float32)
+        single = matrix.ndim == 1
+        if single:
+            matrix = matrix[np.newaxis]
+        
+        reduced = (matrix - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        reduced /= norms
+        
+        return reduced[0] if single else reduced
+    
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(self.path, mean=self.mean, components=self.components,
+                 explained_variance_ratio=self.explained_variance_ratio)
+        self.logger.info(f"PCA參數已儲存: {self.path}")
+    
+    def load(self):
+        data = np.load(self.path)
+        self.mean = data['mean']
+        self.components = data['components']
+        self.explained_variance_ratio = float(data['explained_variance_ratio'])
+        self.logger.info(f"已載入PCA參數: {self.path} ({self.input_dim} -> {self.output_dim} 維)")